@@ -375,19 +375,13 @@ class RandomAreaSelector:
         Greedily operate on oldest operable age classes.
         Returns missing area (i.e., difference between target and operated areas).
         """
-        key = lambda item: max(item[1])
+        key = lambda item: item[1][-1] # oldest operable age
         odt = sorted(list(self.parent.operable_dtypes(acode, period, mask).items()), key=key)
         if verbose:
             print(' entering selector.operate()', len(odt), 'operable dtypes')
         while target_area > 0 and odt:
             while target_area > 0 and odt:
-                popped = odt.pop()
-                try:
-                    dtk, ages = popped #odt.pop()
-                except:
-                    print(odt)
-                    print(popped)
-                    raise
+                dtk, ages = odt.pop()
                 # age = random.choice(ages)
                 upages = ages
                 random.shuffle(upages)
@@ -426,20 +420,14 @@ class GreedyAreaSelector:
         Greedily operate on oldest operable age classes.
         Returns missing area (i.e., difference between target and operated areas).
         """
-        key = lambda item: max(item[1])
+        key = lambda item: item[1][-1] # oldest operable age
         odt = sorted(list(self.parent.operable_dtypes(acode, period, mask).items()), key=key)
         if verbose:
             print(' entering selector.operate()', len(odt), 'operable dtypes')
         while target_area > 0 and odt:
             while target_area > 0 and odt:
-                popped = odt.pop()
-                try:
-                    dtk, ages = popped #odt.pop()
-                except:
-                    print(odt)
-                    print(popped)
-                    raise
-                age = sorted(ages)[-1]
+                dtk, ages = odt.pop()
+                age = ages[-1] # operable ages are sorted (ascending)
                 oa = self.parent.dtypes[dtk].operable_area(acode, period, age)
                 if not oa: continue # nothing to operate
                 area = min(oa, target_area)
@@ -19,6 +19,7 @@ setuptools.setup(
         "Operating System :: OS Independent",
     ],
     python_requires='>=3.6',
-    install_requires=['scipy', 'pandas', 'numpy', 'matplotlib', 'rasterio', 'fiona', 'profilehooks']
+    install_requires=['scipy', 'pandas', 'numpy', 'matplotlib', 'rasterio', 'fiona', 'profilehooks'],
+    extras_require={'numba':['numba']} # optional JIT compilation of numeric kernels (see ws3.common.njit)
 )
  
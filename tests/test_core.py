@@ -2,6 +2,8 @@ import sys
 sys.path.append('./ws3/')
 import core, common
 import pytest
+import copy
+import numpy as np
 # import ws3
 # import ws3.core, ws3.common
 from core import Interpolator, Curve
@@ -13,8 +15,8 @@ def sample_points():
 
 def test_interpolator_initialization(sample_points):
     interpolator = Interpolator(sample_points)
-    assert interpolator.x == [1.0, 3.0, 5.0]
-    assert interpolator.y == [2.0, 4.0, 6.0]
+    assert interpolator.x.tolist() == [1.0, 3.0, 5.0]
+    assert interpolator.y.tolist() == [2.0, 4.0, 6.0]
     assert interpolator.n == 3
 
 def test_interpolator_points(sample_points):
@@ -85,3 +87,76 @@ def test_curve_initialization():
 
 
 
+def test_curve_arithmetic():
+    c1 = Curve(points=[(1, 1.), (2, 2.), (3, 3.)])
+    c2 = Curve(points=[(1, 11.), (2, 22.), (3, 33.)])
+    assert [(c1 * c2)[x] for x in range(5)] == [0., 11., 44., 99., 99.]
+    assert [(c1 + c2)[x] for x in range(5)] == [0., 12., 24., 36., 36.]
+    assert [(c2 - 1.)[x] for x in range(5)] == [-1., 10., 21., 32., 32.]
+    assert [(c2 / c1)[x] for x in range(5)] == [0., 11., 11., 11., 11.]
+    assert Curve.sum([c1, c2, 1.]).points() == (c1 + c2 + 1.).points()
+
+def test_curve_lock_cache():
+    c1 = Curve(points=[(1, 1.), (2, 2.), (3, 3.)])
+    c2 = Curve(points=[(1, 11.), (2, 22.), (3, 33.)])
+    assert c1.mai() is not c1.mai()
+    c1.lock()
+    c2.lock()
+    assert c1.mai() is c1.mai()
+    assert (c1 * c2) is (c1 * c2)
+    assert (c1 * c2) is not (c1 * c1)
+    c3 = Curve(points=[(1, 1.), (2, 2.), (3, 3.)])
+    c3.lock()
+    assert c3._key() == c1._key() and c3._key() != c2._key()
+    assert (c1 * c3) is (c1 * c1) # cache keyed on content
+
+def test_curve_identity_semantics():
+    c1 = Curve('foo', points=[(1, 1.), (2, 2.), (3, 3.)])
+    c2 = Curve('bar', points=[(1, 1.), (2, 2.), (3, 3.)])
+    assert len({c1: 1, c2: 2}) == 2 # unlocked curves are hashable
+    c1.lock()
+    c2.lock()
+    assert c1 != c2 and len({c1, c2}) == 2 # differently labelled curves do not collapse
+    assert c1._key() == c2._key()
+    with pytest.raises(TypeError):
+        Curve(points=[(1, 1.)])._key()
+
+def test_curve_cache_bounded():
+    c1 = Curve(points=[(1, 1.), (2, 2.), (3, 3.)])
+    c1.lock()
+    for i in range(2 * core._CACHE_MAXSIZE):
+        c1 * float(i)
+    assert len(c1._cache) <= core._CACHE_MAXSIZE
+
+def test_curve_simplify_relative():
+    pts = [(x, 100. * (1. - np.exp(-0.03 * x)) + 0.001 * (x % 2)) for x in range(0, 101)]
+    c1 = Curve(points=pts)
+    c2 = Curve(points=[(x, 1000. * y) for x, y in pts])
+    assert 2 < len(c1.points()) < len(pts)
+    assert len(c1.points()) == len(c2.points())
+    c0 = Curve(points=pts, simplify=False)
+    assert abs(sum(c1) - sum(c0)) / sum(c0) < c1.epsilon
+    with pytest.warns(DeprecationWarning):
+        Curve(points=pts, simplify=False).simplify(autotune=True)
+
+def test_curve_getitem_int():
+    c = Curve(points=[(10, 20.), (50, 100.)], xmin=10, xmax=60)
+    assert c[10] == 20. and c[30] == 60. and c[60] == 100.
+    assert c[np.int64(30)] == c[30.]
+    assert c[-1] == c.interp(-1) == 0. and c[5] == 0. # no wrap-around (or offset) below xmin
+    with pytest.raises(IndexError):
+        c[100]
+
+def test_curve_add_points_resets_y():
+    c = Curve(points=[(0, 0.), (10, 10.)], xmax=10)
+    assert c[5] == 5. and list(c)[5] == 5.
+    c.add_points([(0, 0.), (5, 50.), (10, 10.)], simplify=False)
+    assert c[5] == 50. and list(c)[5] == 50.
+
+def test_curve_copy_cache():
+    c1 = Curve(points=[(1, 1.), (2, 2.), (3, 3.)])
+    c1.lock()
+    c2 = copy.copy(c1)
+    c2.label = 'foo'
+    assert c2.mai() is c2.mai()
+    assert not c1._cache and c1.label is None
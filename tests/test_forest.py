@@ -1 +1,131 @@
 from ws3 import forest, common, spatial, core, opt
+import pytest
+
+def test_grow_area_tensor():
+    fm = forest.ForestModel(model_name='test', model_path='.', base_year=2020,
+                            horizon=3, period_length=10, max_age=50)
+    fm.add_theme('th0', basecodes=['dt%i' % i for i in range(100)])
+    for i in range(100): # enough development types to reallocate the model-level area tensor
+        fm.create_dtype_fromkey(('dt%i' % i,))
+        fm.dtypes[('dt%i' % i,)].area(0, 5 if i % 2 else 45, 1.)
+    fm.initialize_areas()
+    fm.grow()
+    dt_young, dt_old = fm.dtypes[('dt1',)], fm.dtypes[('dt0',)]
+    assert [dt_young.area(p, 5 + 10 * (p - 1)) for p in (1, 2, 3)] == [1., 1., 1.]
+    assert [dt_old.area(p, 45 + 10 * (p - 1)) for p in (1, 2, 3)] == [1., 1., 1.] # keeps true age past max age
+    assert [dt_old.area(p, 50) for p in (1, 2, 3)] == [0., 0., 0.]
+    assert fm.inventory(3) == 100.
+
+def test_grow_past_max_age():
+    fm = forest.ForestModel(model_name='test', model_path='.', base_year=2020,
+                            horizon=3, period_length=10, max_age=50)
+    fm.add_theme('th0', basecodes=['a'])
+    dt = fm.create_dtype_fromkey(('a',))
+    dt.add_ycomp('a', 'vol', core.Curve('vol', points=[(0, 0.), (100, 200.)]))
+    dt.area(0, 45, 1.)
+    dt.area(0, 5, 2.)
+    fm.initialize_areas()
+    fm.grow()
+    # expected values from the dict-based area inventory (yields read at true ages past max age)
+    assert [fm.inventory(p) for p in (1, 2, 3)] == [3., 3., 3.]
+    assert [fm.inventory(p, 'vol') for p in (1, 2, 3)] == [110., 170., 230.]
+    assert [fm.inventory(p, 'vol', age=65) for p in (1, 2, 3)] == [0., 0., 130.]
+    # outputs only cover age classes up to max age
+    area = forest.Output(parent=fm, code='area', expression='? _INVENT _AREA', is_basic=True)
+    vol = forest.Output(parent=fm, code='vol', expression='? _INVENT vol', is_basic=True)
+    assert [area(p) for p in (1, 2, 3)] == [3., 2., 2.]
+    assert [vol(p) for p in (1, 2, 3)] == [110., 60., 100.]
+
+def test_null_action_operable_dtypes():
+    fm = forest.ForestModel(model_name='test', model_path='.', base_year=2020,
+                            horizon=3, period_length=10, max_age=50)
+    fm.add_theme('th0', basecodes=['a', 'b'])
+    for k in ('a', 'b'):
+        fm.create_dtype_fromkey((k,)).area(0, 30, 1.)
+    fm.initialize_areas()
+    fm.add_null_action()
+    assert fm._operable_index[('null', 1)] == {('a',), ('b',)} # compiled when set
+    assert fm.operable_dtypes('null', 1) == {('a',): [30], ('b',): [30]}
+    assert fm.operable_dtypes('null', 1, mask=('b',)) == {('b',): [30]}
+
+def test_complex_ycomp_labels_not_shared():
+    fm = forest.ForestModel(model_name='test', model_path='.', base_year=2020,
+                            horizon=3, period_length=10, max_age=50)
+    fm.add_theme('th0', basecodes=['a', 'b'])
+    vol = fm.register_curve(core.Curve('vol', points=[(0, 0.), (100, 200.)]))
+    for k in ('a', 'b'):
+        dt = fm.create_dtype_fromkey((k,))
+        dt.add_ycomp('a', 'vol', vol)
+    fm.dtypes[('a',)].add_ycomp('c', 'foo', '_MAI(vol)')
+    fm.dtypes[('b',)].add_ycomp('c', 'bar', '_MAI(vol)')
+    foo, bar = fm.dtypes[('a',)].ycomp('foo'), fm.dtypes[('b',)].ycomp('bar')
+    assert foo._key() == bar._key() # same content...
+    assert (foo.label, bar.label) == ('foo', 'bar') # ...but not the same labelled object
+
+def test_mask_undefined_theme_code():
+    fm = forest.ForestModel(model_name='test', model_path='.', base_year=2020,
+                            horizon=3, period_length=10, max_age=50)
+    fm.add_theme('th0', basecodes=['a', 'b'])
+    fm.create_dtype_fromkey(('a',))
+    assert fm.match_mask(('a',), ('a',)) and not fm.match_mask(('b',), ('a',))
+    with pytest.raises(KeyError):
+        fm.match_mask(('x',), ('a',))
+    assert fm.unmask(('x',)) == []
+
+def test_greedy_pick():
+    assert list(forest._greedy_pick([3., 2., 4.], 4.)) == [3., 1., 0.]
+    oa = [1.] * forest._GREEDY_PICK_NJIT_MIN
+    assert list(forest._greedy_pick(oa, 10.5)) == [1.] * 10 + [0.5] + [0.] * (len(oa) - 11)
+
+def test_area_tensor_sized_to_ages():
+    fm = forest.ForestModel(model_name='test', model_path='.', base_year=2020,
+                            horizon=3, period_length=10, max_age=1000)
+    fm.add_theme('th0', basecodes=['a'])
+    dt = fm.create_dtype_fromkey(('a',))
+    dt.area(0, 30, 1.)
+    assert fm._area_tensor.shape[2] < fm.max_age
+    dt.area(0, 200, 2.)
+    assert fm._area_tensor.shape[2] >= 200 + 1 + 3 * 10
+    assert dt.area(0, 30) == 1. and dt.area(0, 200) == 2.
+    assert fm.age_class_distribution(0)[999] == 0.
+
+def test_area_setter_age_bounds():
+    fm = forest.ForestModel(model_name='test', model_path='.', base_year=2020,
+                            horizon=3, period_length=10, max_age=50)
+    fm.add_theme('th0', basecodes=['a'])
+    dt = fm.create_dtype_fromkey(('a',))
+    with pytest.raises(ValueError):
+        dt.area(0, -1, 1.)
+    assert dt.area(0) == 0.
+    dt.area(0, 70, 1.) # within overflow columns (true age kept)
+    assert dt.area(0, 70) == 1.
+    with pytest.warns(UserWarning):
+        dt.area(0, 200, 1.)
+    assert dt.area(0, 50 + 3 * 10) == 1. and dt.area(0) == 2.
+
+def test_unmask_after_dtype_removal():
+    fm = forest.ForestModel(model_name='test', model_path='.', base_year=2020,
+                            horizon=3, period_length=10, max_age=50)
+    fm.add_theme('th0', basecodes=['a', 'b', 'c'])
+    fm.create_dtype_fromkey(('a',))
+    fm.create_dtype_fromkey(('b',))
+    assert fm.unmask(('b',)) == [('b',)] and fm.unmask(('?',)) == [('a',), ('b',)]
+    del fm.dtypes[('b',)]
+    fm.create_dtype_fromkey(('c',)) # same dtype count as before
+    assert fm.unmask(('b',)) == [] and fm.unmask(('c',)) == [('c',)]
+    assert fm.unmask(('?',)) == [('a',), ('c',)]
+    fm.dtypes = {('a',): fm.dtypes[('a',)]}
+    assert fm.unmask(('c',)) == [] and fm.unmask(('a',)) == [('a',)]
+
+def test_action_output_empty_ages():
+    fm = forest.ForestModel(model_name='test', model_path='.', base_year=2020,
+                            horizon=3, period_length=10, max_age=50)
+    fm.add_theme('th0', basecodes=['a'])
+    dt = fm.create_dtype_fromkey(('a',))
+    dt.add_ycomp('a', 'vol', core.Curve('vol', points=[(0, 0.), (100, 200.)]))
+    dt.area(0, 30, 1.)
+    fm.initialize_areas()
+    fm.add_null_action()
+    fm.apply_action(('a',), 'null', 1, 30, 1.)
+    vol = forest.Output(parent=fm, code='vol', expression='? @YLD(vol,1000..2000) null vol', is_basic=True)
+    assert vol(1) == 0. # no ages match the condition (nothing to evaluate)
@@ -31,7 +31,7 @@ Attributes:
     PERIOD_LENGTH_DEFAULT (int): Default number of years per period.
     MIN_AGE_DEFAULT (int): Default value for `core.Curve.xmin`.
     MAX_AGE_DEFAULT (int): Default value for `core.Curve.xmax`.
-    CURVE_EPSILON_DEFAULT (float): Defalut value for `core.Curve.epsilon`.
+    CURVE_EPSILON_DEFAULT (float): Defalut value for `core.Curve.epsilon` (simplification tolerance, relative to peak y).
     AREA_EPSILON_DEFAULT = 0.01
     
 """
@@ -71,7 +71,7 @@ import binascii
 
 try:
     import pickle as pickle
-except:
+except ImportError:
     import pickle
 import math
 #from math import exp, log
@@ -79,6 +79,17 @@ import fiona
 from fiona.transform import transform_geom
 from fiona.crs import from_epsg
 
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError: # numba is optional (njit-decorated functions then run as plain Python)
+    HAVE_NUMBA = False
+    prange = range
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda f: f
+
 def is_num(s):
     """
     This function checks if a given input has a numerical value.
@@ -87,7 +98,7 @@ def is_num(s):
     try:
         float(s)
         return True
-    except:
+    except (TypeError, ValueError):
         return False
 
 def reproject(f, srs_crs, dst_crs):
@@ -268,7 +279,7 @@ def rasterize_stands(shp_path, tif_path, theme_cols, age_col, blk_col='', age_di
             hdt[h] = dt
             try:
                 age = np.int32(math.ceil(fp[age_col]/float(age_divisor)))
-            except:
+            except Exception:
                 #######################################
                 # DEBUG
                 # print(i, fp)                
@@ -280,7 +291,7 @@ def rasterize_stands(shp_path, tif_path, theme_cols, age_col, blk_col='', age_di
             if cap_age and age > cap_age: age = cap_age
             try:
                 assert age > 0
-            except:
+            except AssertionError:
                 if fp[age_col] == 0:
                     age = np.int32(1)
                 else:
@@ -370,7 +381,7 @@ HORIZON_DEFAULT = 30
 PERIOD_LENGTH_DEFAULT = 10
 MIN_AGE_DEFAULT = 0
 MAX_AGE_DEFAULT = 1000
-CURVE_EPSILON_DEFAULT = 0.01
+CURVE_EPSILON_DEFAULT = 0.001
 AREA_EPSILON_DEFAULT = 0.01
 
 ##################################################
@@ -497,7 +508,7 @@ def is_num(s):
     try:
         float(s)
         return True
-    except:
+    except (TypeError, ValueError):
         return False
 
     
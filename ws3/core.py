@@ -27,11 +27,67 @@
 #from scipy.interpolate import interp1d
 from bisect import bisect_left
 from itertools import repeat
-import copy
+import functools
 import math
+import warnings
+import numpy as np
 
 from ws3 import common
 
+_X_CACHE = {} # (xmin, xmax) -> shared read-only float64 x array
+
+def _x_array(xmin, xmax):
+    if (xmin, xmax) not in _X_CACHE:
+        x = np.arange(xmin, xmax+1, dtype=np.float64)
+        x.flags.writeable = False
+        _X_CACHE[(xmin, xmax)] = x
+    return _X_CACHE[(xmin, xmax)]
+
+@common.njit
+def _rdp(x, y, tol):
+    """
+    Ramer-Douglas-Peucker polyline simplification, using vertical distance to the chord 
+    (y is a function of x). Returns a boolean mask of the points to keep.
+    """
+    keep = np.zeros(x.size, dtype=np.bool_)
+    keep[0] = keep[-1] = True
+    stack = [(0, x.size - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2: continue
+        d = np.abs(y[i+1:j] - (y[i] + (y[j] - y[i]) * (x[i+1:j] - x[i]) / (x[j] - x[i])))
+        k = int(np.argmax(d))
+        if d[k] > tol:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return keep
+
+
+_CACHE_MAXSIZE = 64 # max number of cached derived curves per locked curve
+
+
+def _cached(f):
+    """
+    Caches the results of a ``Curve`` method on locked curves (point list cannot change once locked).
+    Curve arguments are keyed by content (see ``Curve._key``), and only if they are locked too.
+    Cached curves are shared by all callers (copy before modifying attributes such as ``label``).
+    Each curve keeps at most ``_CACHE_MAXSIZE`` results (oldest entries are evicted first).
+    """
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        if not self.is_locked or any(isinstance(a, Curve) and not a.is_locked for a in args):
+            return f(self, *args, **kwargs)
+        key = (f.__name__,) + tuple(a._key() if isinstance(a, Curve) else a for a in args) + tuple(sorted(kwargs.items()))
+        result = self._cache.get(key)
+        if result is None:
+            if len(self._cache) >= _CACHE_MAXSIZE: del self._cache[next(iter(self._cache))]
+            result = self._cache[key] = f(self, *args, **kwargs)
+        return result
+    return wrapper
+
+
 """
 Used by ``Curve`` class to interpolate between real data points.
 """
@@ -42,17 +98,29 @@ class Interpolator(object):
     def __init__(self, points):
         #if any([_y - _x <= 0 for _x, _y in zip(x, x[1:])]):
         #    raise ValueError("x_list must be in strictly ascending order!")
-        x, y = list(zip(*points))
-        self.x = list(map(float, x))
-        self.y = list(map(float, y))
-        self.n = len(x)
-        intervals = list(zip(self.x, self.x[1:], self.y, self.y[1:]))
-        #print intervals
-        try:
-            self.m = [(y2 - y1)/(x2 - x1) for x1, x2, y1, y2 in intervals]
-        except:
-            print(intervals)
-            raise
+        # one (2, n) C-contiguous block, so x and y rows are contiguous views
+        self._set_xy(np.array(points, dtype=np.float64).T.copy())
+
+    @classmethod
+    def from_arrays(cls, x, y):
+        """
+        Creates an Interpolator directly from parallel x and y arrays (no point tuples).
+
+        :param array x: The x-values (sorted ascending).
+        :param array y: The y-values.
+        """
+        self = cls.__new__(cls)
+        self._set_xy(np.array([x, y], dtype=np.float64))
+        return self
+
+    def _set_xy(self, xy):
+        self.x, self.y = xy
+        self.n = self.x.size
+        with np.errstate(divide='raise', invalid='raise'):
+            self.m = np.diff(self.y) / np.diff(self.x)
+        # plain-list copies for the scalar path (bisect on a list beats numpy for one x)
+        self._x, self._y, self._m = self.x.tolist(), self.y.tolist(), self.m.tolist()
+        self._y_mono = bool(np.all(self.m >= 0.)) # lookup can use binary search
         
     def points(self):
         """
@@ -62,13 +130,15 @@ class Interpolator(object):
         #print('foo')
         #print(self.x)
         #print(list(map(int, self.x)), self.y)
-        return list(zip(list(map(int, self.x)), self.y))
+        return list(zip(self.x.astype(int).tolist(), self._y))
         
     def __call__(self, x):
-        if x == 0: return self.y[0]
-        i = bisect_left(self.x, x) - 1
+        if not isinstance(x, (int, float)) and np.ndim(x): # array-like (evaluate all points in one pass)
+            return np.interp(x, self.x, self.y)
+        i = bisect_left(self._x, x) - 1
+        if i < 0: return self._y[0] # (clamp below first point)
         #print x, self.m[i]
-        return self.y[i] + self.m[i] * (x - self.x[i])          
+        return self._y[i] + self._m[i] * (x - self._x[i])          
         # try:
         #     return self.y_list[i] + self.slopes[i] * (x - self.x_list[i])    
         # except IndexError:
@@ -101,24 +171,28 @@ class Interpolator(object):
         #         raise
         ##########################################################################
         if not from_right:
-            #_x = self.x[0]
-            for i, x in enumerate(self.x):
-                if self.y[i] > y: break
-            i -= 1
-            if i == self.n - 1: return self.x[-1]
-            try:
-                return self.x[i] + (y - self.y[i])/self.m[i] if self.m[i] else self.x[i]
-            except:
-                print(i, self.n, self.x, self.y)
-                raise
-            return x
+            # index of first point with y-value above target (binary search if y is non-decreasing)
+            if self._y_mono:
+                i = int(np.searchsorted(self.y, y, side='right'))
+            else:
+                above = self.y > y
+                i = int(np.argmax(above)) if above.any() else self.n
+            i = min(i, self.n - 1) - 1
+            if i == self.n - 1: return self._x[-1]
+            return self._x[i] + (y - self._y[i])/self._m[i] if self._m[i] else self._x[i]
         else:
-            raise # not implemented yet...
+            raise NotImplementedError('lookup from right not implemented yet')
         
             
 class Curve:
     """
     Describes change in state over time (between treatments)
+
+    .. note::
+       ``epsilon`` is the simplification tolerance: interpolated y-values of the simplified curve stay
+       within ``epsilon`` times the largest absolute y-value of the original point list. In earlier
+       versions, ``epsilon`` bounded the relative error of the sum of y-values instead (area under 
+       the curve), which allows much larger local errors, so the default is now 0.001 (was 0.01).
     """
     _type_default = 'a'
     
@@ -141,101 +215,103 @@ class Curve:
         self.period_length = period_length
         self.xmin = xmin
         self.xmax = xmax
-        self.x = range(xmin, xmax+1)
+        self.x = _x_array(xmin, xmax)
         self.is_special = is_special
         self._y = None
         self.epsilon = epsilon
         self.is_locked = False
-        self.add_points(points or [(0, 0)], simplify=simplify) # defaults to zero curve
+        self._cache = {}
+        self._content_key = None
+        self.add_points(points if points is not None and len(points) else [(0, 0)], simplify=simplify) # defaults to zero curve
 
-    def simplify(self, points=None, autotune=True, compile_y=False, verbose=False):
+    def simplify(self, points=None, autotune=None, compile_y=False, verbose=False):
         """
-        Simplifies the curve by removing redundant points.
+        Simplifies the curve by removing redundant points (Ramer-Douglas-Peucker, see ``_rdp``).
+        Interpolated y-values stay within ``epsilon`` times the largest absolute y-value of the original point list
+        (a vertical distance bound relative to peak y, so simplification does not depend on yield units; 
+        this replaces the area-sum error bound of earlier versions, see ``Curve``).
 
-        :param list of tuples points: The points to simplify. Defaults to None.
-        :param bool autotune: Flag indicating whether to automatically tune the simplification process. Defaults to True.
+        :param points: Deprecated (ignored; the curve's own point list is always simplified).
+        :param autotune: Deprecated (ignored).
         :param bool compile_y: Flag indicating whether to compile the y-component. Defaults to False.
         :param bool verbose: Flag indicating whether to print verbose output. Defaults to False.
         """
+        if points is not None or autotune is not None:
+            warnings.warn('Curve.simplify() points and autotune parameters are deprecated (ignored)', 
+                          DeprecationWarning, stacklevel=2)
         if self.is_special: return
         assert not self.is_locked
-        points = self.points() if points is None else points
-        n = len(points)
-        ysum = sum(self)
-        if n <= 2 or ysum < self.epsilon: return
-        estep = self.epsilon
-        error = 0.
-        e = 0.
-        sentinel = 0
-        max_iters = 100
-        while error < self.epsilon and sentinel < max_iters and len(self.points()) > 2:
-            _points = copy.copy(self.points()) # backup
-            self._simplify(e)
-            if sentinel > 0 and len(self.points()) == len(_points): break
-            error = abs(sum(self) - ysum) / ysum            
-            if error >= self.epsilon: break
-            e += estep
-            sentinel += 1
-        self.interp = Interpolator(_points) # restore from backup
+        n = self.interp.n
+        if n <= 2: return
+        x, y = self.interp.x, self.interp.y
+        keep = _rdp(x, y, self.epsilon * float(np.abs(y).max()))
+        self.interp = Interpolator.from_arrays(x[keep], y[keep])
         self._y = None
         if compile_y: self._compile_y()
         if verbose:
-            error = abs(sum(self) - ysum) / ysum
-            print('after final simplify', n, len(self.points()), float(n)/float(len(self.points())), error, ysum, sentinel) #, e, abs(sum(self) - ysum) / ysum
+            print('after final simplify', n, self.interp.n, float(n)/float(self.interp.n))
 
-        
-    def _simplify(self, e, compile_y=False):
-        """
-        .. note:: 
-           Implementation was modified so that point list is stored only once (in interp).
-        """
-        points = self.points()
-        p = copy.copy(points)
-        #print self.label, p
-        n = 0
-        for i in range(1, len(p) - 1):
-            s1, s2 = [(p[i+j][1] - p[i+j-1][1]) / (p[i+j][0] - p[i+j-1][0]) for j in [0, 1]]
-            if abs(s2 - s1) < e:
-                n += 1
-                points.remove(p[i]) # remove redundant point
-        self.interp = Interpolator(points)
-        self._y = None
-        if compile_y: self._compile_y()
-            
     def add_points(self, points, simplify=True, compile_y=False):
         """
         Adds points to the curve and optionally simplifies it.
     
-        :param list of tuples points: The points to add to the curve.
+        :param list of tuples points: The points to add to the curve (or an equivalent (n, 2) array).
         :param bool simplify: Flag indicating whether to simplify the curve after adding points. Defaults to True.
         :param bool compile_y: Flag indicating whether to compile the y-component after adding points. Defaults to False.
         """
         assert not self.is_locked
-        x, y = list(zip(*points)) # assume sorted ascending x
-        x = list(x)
-        y = [float(_y) for _y in y]
+        points = np.asarray(points, dtype=np.float64) # (n, 2), assume sorted ascending x
+        x, y = points[:, 0], points[:, 1]
         # seems ok... (never tripped the assertion so far)
         # assert x[0] >= 0 and x[-1] <= self.xmax
         x_min = x[0]
         if x_min > 0:
-            if x_min>1:
-                x.insert(0, x_min-1)
-                y.insert(0, 0.)
-            x.insert(0, 0)
-            y.insert(0, 0.)
+            _x = [0., x_min-1] if x_min > 1 else [0.]
+            x = np.concatenate((_x, x))
+            y = np.concatenate((np.zeros(len(_x)), y))
         if x[-1] < self.xmax:
-            x.append(self.xmax)
-            y.append(y[-1])
-        points = list(zip(x, y))
-        self.interp = Interpolator(points)
+            x = np.append(x, self.xmax)
+            y = np.append(y, y[-1])
+        self.interp = Interpolator.from_arrays(x, y)
+        self._y = None # (compiled y-values are stale once the point list changes)
         if simplify:
-            self.simplify(points, compile_y)
+            self.simplify(compile_y=compile_y)
         else:
             if compile_y: self._compile_y()
 
     def points(self):
         return self.interp.points()
 
+    def __copy__(self):
+        """
+        Shallow copy, with its own (empty) cache of derived curves (so derived curves computed 
+        on a relabelled copy do not land in the cache of the original, and vice versa). 
+        The y-values array is shared (read-only once locked).
+        """
+        c = self.__class__.__new__(self.__class__)
+        c.__dict__.update(self.__dict__)
+        c._cache = {}
+        return c
+
+    def lock(self):
+        """
+        Locks the curve. Point list (and y-values) must not change after this, so results of
+        derived curve methods and operators can be cached.
+        """
+        self.is_locked = True
+        self._as_array().flags.writeable = False
+        self._content_key = (self.xmin, self.xmax, self._y.tobytes())
+
+    def _key(self):
+        """
+        Returns content key of locked curve (x range and y-values), used to key memo caches
+        (locked curves with the same content give the same results). Curves themselves compare 
+        and hash by identity.
+        """
+        if not self.is_locked:
+            raise TypeError('content key of unlocked Curve (call lock() first)')
+        return self._content_key
+
     ##########################################################################################
     # NOTE: This is confirmed to work!... but has two (minor) problems:
     #       * evaluates more points than necessary
@@ -269,6 +345,7 @@ class Curve:
         else:
             return int(x)
     
+    @_cached
     def range(self, lo=None, hi=None, as_bounds=False, left_range=True):
         """
         Returns a Curve representing the range within the specified bounds.
@@ -282,42 +359,51 @@ class Curve:
         ub = int(round(self.interp.lookup(hi, from_right=not left_range))) if hi is not None else self.xmax
         #print self.label, 'lo', lo, 'hi', hi, 'lb', lb, 'ub', ub
         #print self.points()
-        points = [(lb, 1), (ub, 1)] if ub > lb else [(lb, 1)]
+        if as_bounds: 
+            return lb, ub
+        return Curve.step(lb, ub, self.xmax)
+
+    @staticmethod
+    def step(lb, ub, xmax):
+        """
+        Returns a 0/1 step function Curve (1 from lb to ub, inclusive, 0 elsewhere on [0, xmax]).
+
+        :param int lb: The lower bound of the step.
+        :param int ub: The upper bound of the step.
+        :param int xmax: The upper bound of the x range.
+        """
+        points = []
         if lb > 0:
+            points.append((0, 0))
             if lb > 1:
-                points.insert(0, (lb-1, 0))
-            points.insert(0, (0, 0))
-        if ub < self.xmax:
-            if ub < self.xmax - 1:
+                points.append((lb-1, 0))
+        points.extend([(lb, 1), (ub, 1)] if ub > lb else [(lb, 1)])
+        if ub < xmax:
+            if ub < xmax - 1:
                 points.append((ub+1, 0))      
-            points.append((self.xmax, 0))
-        if as_bounds: 
-            return lb, ub
-        else:
-            #print points
-            return Curve(points=points)
+            points.append((xmax, 0))
+        #print points
+        return Curve(points=points, simplify=False) # 0/1 step function is already minimal
         
+    @_cached
     def cai(self):
         """
         Calculates the current annual increment (CAI) as a curve.
         """
         #points = list(zip(self.interp.x, self.interp.m))
-        X = list(range(1, self.xmax))
-        Y = [self[x] - self[x-1] for x in X]
-        points = list(zip(X, Y))
-        #print(points)
-        return Curve(points=points)
+        y = self._as_array()
+        return Curve(points=np.column_stack((self.x[1:-1], np.diff(y)[:-1])))
         #return Curve(points=list(zip(x, (y[1:]-y[:-1])/self.period_length)))
             
+    @_cached
     def mai(self):
         """
         Calculates the mean annual increment (MAI) as a curve.
         
         """
-        X = range(1, self.xmax)
-        Y = [self[x] / x for x in X[1:]] 
-
-        return Curve(points=list(zip(X, Y)))
+        y = self._as_array()
+        # NOTE: y(x+1)/(x+1) is paired with x (same alignment as the original zip of X and X[1:])
+        return Curve(points=np.column_stack((self.x[1:-2], y[2:-1] / self.x[2:-1])))
 
         
         #try:
@@ -326,65 +412,129 @@ class Curve:
         #    print(self.x) #[1:]
         #return Curve(points=p)
             
+    @_cached
     def ytp(self):
         """
         Returns the yield-to-point (YTP) curve.
         """
-        y = self.y()
-        argmax = y.index(max(y))
-        return Curve(points=[(x, argmax-x) for x in self.x])
+        argmax = int(np.argmax(self._as_array())) # first x at max y
+        x0, x1 = self.x[0], self.x[-1]
+        return Curve(points=[(x0, argmax-x0), (x1, argmax-x1)], simplify=False) # straight line, slope -1
+
+    @staticmethod
+    def reduce(ufunc, curves):
+        """
+        Combines curves (and float constants) with a numpy ufunc in a single pass over the y-arrays, building
+        only one new Curve at the end (instead of one per intermediate result of a chained operator expression).
+
+        :param numpy.ufunc ufunc: The binary ufunc to reduce with (e.g. ``numpy.add``).
+        :param list curves: The operands (at least one must be a Curve).
+        """
+        x = next(c.x for c in curves if isinstance(c, Curve))
+        ys = [_yvals(c) for c in curves]
+        y = ufunc.reduce(np.broadcast_arrays(*ys))
+        return Curve(points=np.column_stack((x, y)))
+
+    @staticmethod
+    def sum(curves):
+        """
+        Returns the sum of a list of curves (see ``Curve.reduce``).
+        """
+        return Curve.reduce(np.add, curves)
 
     def _compile_y(self):
-        self._y = [self.interp(x) for x in self.x]
+        self._y = np.interp(self.x, self.interp.x, self.interp.y)
+
+    def _as_array(self):
+        """
+        Returns y-values as a float64 array (compiled on demand, until the point list changes).
+        """
+        if self._y is None:
+            self._compile_y()
+        return self._y
     
     def y(self, compile_y=False):
         """
-        Calculates the y-values of the curve.
+        Calculates the y-values of the curve (as a float64 array).
 
         :param bool compile_y: Flag indicating whether to compile the y-component of the curve. Defaults to False.
         """
-        if compile_y and not self._y:
-            self._compile_y()
-            return self._y
+        if compile_y:
+            return self._as_array()
         else:
-            return [self.interp(x) for x in self.x]
+            return np.interp(self.x, self.interp.x, self.interp.y)
         
     def __iter__(self):
-        for y in self.y(): yield y
+        for y in self._as_array().tolist(): yield y
            
     def __getitem__(self, x):
-        return self._y[x] if self._y else self.interp(x)
+        if isinstance(x, (int, np.integer)):
+            y, i = self._as_array(), x - self.xmin # compiled y-values start at xmin
+            if 0 <= i < y.size: return float(y[i])
+        return self.interp(x)
 
+    @_cached
     def __and__(self, other):
-        y = [self[x] and other[x] for x in self.x] 
-        return Curve(points=list(zip(self.x, y)))  
+        a, b = self._as_array(), other._as_array()
+        y = np.where(a != 0., b, a) # same as elementwise (a and b)
+        return Curve(points=np.column_stack((self.x, y)))  
     
+    @_cached
     def __or__(self, other):
-        y = [self[x] or other[x] for x in self.x] 
-        return Curve(points=list(zip(self.x, y)))  
+        a, b = self._as_array(), other._as_array()
+        y = np.where(a != 0., a, b) # same as elementwise (a or b)
+        return Curve(points=np.column_stack((self.x, y)))  
     
+    @_cached
     def __mul__(self, other):
-        y = [_y*other for _y in self.y()] if isinstance(other, float) else [a*b for a,b in zip(self.y(), other.y())]
-        return Curve(points=list(zip(self.x, y)))  
+        y = curve_mul(self, other)
+        return Curve(points=np.column_stack((self.x, y)))  
     
-    def __div__(self, other):
-        y = [a/b for a, b in zip(self.y(), [1. if not y else y for y in other.y()])]
-        return Curve(points=list(zip(self.x, y)))
+    @_cached
+    def __truediv__(self, other):
+        b = other._as_array()
+        y = self._as_array() / np.where(b == 0., 1., b)
+        return Curve(points=np.column_stack((self.x, y)))
         
+    @_cached
     def __add__(self, other):
-        y = [_y+other for _y in self.y()] if isinstance(other, float) else [a+b for a,b in zip(self.y(), other.y())]
-        return Curve(points=list(zip(self.x, y)))  
+        y = curve_add(self, other)
+        return Curve(points=np.column_stack((self.x, y)))  
 
+    @_cached
     def __sub__(self, other):
-        y = [_y-other for _y in self.y()] if isinstance(other, float) else [a-b for a,b in zip(self.y(), other.y())]
-        return Curve(points=list(zip(self.x, y)))
+        y = self._as_array() - (other if isinstance(other, float) else other._as_array())
+        return Curve(points=np.column_stack((self.x, y)))
     
     __rmul__ = __mul__
     __radd__ = __add__
     __rsub__ = __sub__
+
+
+def _yvals(c):
+    return c._as_array() if isinstance(c, Curve) else c
+
+def curve_add(a, b):
+    """
+    Returns y-values of ``a + b`` as a float64 array, without building a new Curve 
+    (use inside chained expressions, and build one Curve from the final array).
+
+    :param a: A Curve or a float.
+    :param b: A Curve or a float.
+    """
+    return _yvals(a) + _yvals(b)
+
+def curve_mul(a, b):
+    """
+    Returns y-values of ``a * b`` as a float64 array, without building a new Curve (see ``curve_add``).
+
+    :param a: A Curve or a float.
+    :param b: A Curve or a float.
+    """
+    return _yvals(a) * _yvals(b)
+
     
-    
-if __name__ in '__main__':
+if __name__ == '__main__':
     c1 = Curve('foo', points=[(1, 1.), (2, 2.), (3, 3.)])
     c2 = Curve('bar', points=[(1, 11.), (2, 22.), (3, 33.)])
     c3 = Curve('qux', points=[(1, 111.), (2, 222.), (3, 333.)])
@@ -415,7 +565,7 @@ if __name__ in '__main__':
     #for x in range(10): print x, c4.y[x]
     print()
     print()
-    print('test __div__')
+    print('test __truediv__')
     print()
     c4 = c1 / c2
     for x in range(10): print(x, c1[x], c2[x], c4[x])
@@ -37,9 +37,13 @@ import operator
 import random
 import itertools
 from itertools import chain
+import functools
+import heapq
+import warnings
 from functools import reduce
 _cfi = chain.from_iterable
 from collections import defaultdict as dd
+import numpy as np
 import pandas as pd
 
 
@@ -47,7 +51,7 @@ try:
     from ws3 import common
     from ws3 import core
     from ws3 import opt
-except: # "__main__" case
+except ImportError: # "__main__" case
     from ws3 import common
     from ws3 import core
     from ws3 import opt
@@ -58,6 +62,206 @@ from pdb import set_trace
 #_mad = common.MAX_AGE_DEFAULT
 
 
+_RE_ARGS = re.compile(r'\s?,\s?')
+_RE_PARENS = re.compile(r'(?<=\().*(?=\))')
+_RE_KEYWORD = re.compile(r'(?<=_)[A-Z]+(?=\()')
+# section parsing patterns (compiled once, used on every line of input files)
+_RE_COMMENT_CURLY = re.compile(r'^\s*(;|{|$)')
+_RE_CURLY = re.compile(r'\{.*?\}', re.M|re.S)
+_RE_NEWLINE = re.compile(r'[\r\n]+', re.M|re.S)
+_RE_WS = re.compile(r'\s+')
+_RE_CONSTANT = re.compile(r'#[A-Za-z0-9_]*')
+_RE_AGGREGATE = re.compile(r'^\s*\*AGGREGATE')
+_RE_REPLACE = re.compile(r'(?<=_REPLACE\().*(?=\))')
+_RE_APPEND = re.compile(r'(?<=_APPEND\().*(?=\))')
+_RE_AT = re.compile(r'@.+\)')
+
+
+def _is_comment(l):
+    """
+    Returns True if line is blank or a comment (i.e., first non-whitespace character is ';').
+    """
+    l = l.lstrip()
+    return not l or l[0] == ';'
+
+
+def _read_section_lines(path):
+    """
+    Reads section file in one pass and returns list of (line number, line) tuples,
+    skipping blank and comment lines, with surrounding whitespace and trailing comments stripped.
+    """
+    with open(path) as f:
+        lines = f.read().splitlines()
+    return [(lnum, l.strip().partition(';')[0].strip()) for lnum, l in enumerate(lines) if not _is_comment(l)]
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_product_expr(expr, ynames):
+    """
+    Compiles product expression (once), replacing references to yield components with ``_y<i>`` variables.
+    Returns (code object, tuple of referenced ynames, in variable index order).
+    """
+    refs, tokens = [], []
+    for token in expr.split(' '):
+        if token in ynames: # found reference to ycomp
+            if token not in refs: refs.append(token)
+            tokens.append('_y%i' % refs.index(token))
+        else:
+            tokens.append(token)
+    return compile(' '.join(tokens), '<product>', 'eval'), tuple(refs)
+
+
+_RE_REPLACE_EXPR = re.compile(r'^\s*_TH(\d+)\s*(?:([+-])\s*(\d+))?\s*$')
+
+@functools.lru_cache(maxsize=None)
+def _parse_replace_expr(expr):
+    """
+    Parses ``_THi``, ``_THi + k`` or ``_THi - k`` _REPLACE expression into (theme index, integer offset) tuple
+    (None if expression has some other shape).
+    """
+    match = _RE_REPLACE_EXPR.match(expr)
+    if not match: return None
+    ti, sign, k = match.groups()
+    offset = int(k) if k else 0
+    return int(ti) - 1, -offset if sign == '-' else offset
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_age_condition(condition):
+    """
+    Parses ``@AGE(lo..hi)`` condition string into range of ages.
+    """
+    lo, hi = [int(a) for a in condition[5:-1].split('..')]
+    return range(lo, hi+1)
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_yld_condition(condition):
+    """
+    Parses ``@YLD(yname,lo..hi)`` condition string into (yname, lo, hi) tuple.
+    """
+    args = _RE_ARGS.split(condition[5:-1])
+    lo, hi = [float(y) for y in args[1].split('..')]
+    return args[0].lower(), lo, hi
+
+
+@functools.lru_cache(maxsize=None)
+def _mask_fixed(mask):
+    """
+    Returns tuple of (theme index, theme code) pairs for non-wildcard values in (target) mask.
+    """
+    return tuple((i, v) for i, v in enumerate(mask) if v != '?')
+
+
+def _keyword_int(tokens, keyword):
+    """
+    Returns int value following keyword in tokens (None if keyword missing or value malformed).
+    """
+    if keyword not in tokens: return None
+    try:
+        return int(tokens[tokens.index(keyword)+1])
+    except (ValueError, IndexError):
+        return None
+
+
+def _keyword_theme_arg(pattern, l):
+    """
+    Returns (theme index, argument) tuple from a ``_KEYWORD(_THn, arg)`` expression (None if malformed).
+    """
+    match = pattern.search(l)
+    if not match: return None
+    args = _RE_ARGS.split(match.group(0))
+    try:
+        return int(args[0][3]) - 1, args[1]
+    except (ValueError, IndexError):
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_oper_expr(expr):
+    """
+    Parses operability expression into (oper, lhs, rel_operators, rhs) tuple.
+    Cached, as the same few expressions are shared by many development types.
+    """
+    expr = expr.replace('&', 'and').replace('|', 'or')
+    oper = None
+    if 'and' in expr:
+        oper = 'and'
+    elif 'or' in expr:
+        oper = 'or'
+    lhs, rel_operators, rhs = [], [], []
+    for cc in expr.split(' %s ' % oper): # single pass over (lhs, operator, rhs) conditions
+        l, r, v = cc.split(' ')
+        lhs.append(l)
+        rel_operators.append(r)
+        rhs.append(float(v))
+    return oper, tuple(lhs), tuple(rel_operators), tuple(rhs)
+
+
+def _grow_areas(areas, start_period, end_period, period_length):
+    """
+    Ages (period, age) area inventory by one period at a time, from start_period to end_period (in place).
+    Also works on a stack of inventories (leading axes), so all development types grow in one pass.
+    Area aging past the last age column is lumped into it.
+    """
+    pl = period_length
+    for p in range(start_period, end_period):
+        src, dst = areas[..., p, :], areas[..., p+1, :]
+        dst[..., :pl] = 0.
+        dst[..., pl:] = src[..., :-pl] # age shift (one period)
+        dst[..., -1] += src[..., -pl:].sum(axis=-1) # lump area aging past last age column into it
+
+
+@common.njit(parallel=True, cache=True)
+def _grow_kernel(areas, start_period, end_period, period_length):
+    """
+    Compiled equivalent of ``_grow_areas`` for a (development type, period, age) area tensor
+    (development types are grown in parallel).
+    """
+    n, _, na = areas.shape
+    pl = period_length
+    for r in common.prange(n):
+        for p in range(start_period, end_period):
+            lump = 0.
+            for a in range(max(na-pl, 0), na):
+                lump += areas[r, p, a] # area aging past last age column
+            for a in range(na-1, pl-1, -1):
+                areas[r, p+1, a] = areas[r, p, a-pl] # age shift (one period)
+            for a in range(min(pl, na)):
+                areas[r, p+1, a] = 0.
+            areas[r, p+1, na-1] += lump # lump into last age column
+
+
+_AREA_TENSOR_CHUNK_MIN = 16 # min number of development type slots added to the area tensor per reallocation
+_AREA_TENSOR_CHUNK_MAX = 1024 # max number of development type slots added to the area tensor per reallocation
+_GREEDY_PICK_NJIT_MIN = 256 # min number of candidates worth a call to the jitted kernel
+
+
+@common.njit(cache=True)
+def _greedy_pick_kernel(oa, target_area):
+    result = np.zeros(oa.size)
+    for i in range(oa.size):
+        if target_area <= 0.: break
+        result[i] = min(oa[i], target_area)
+        target_area -= result[i]
+    return result
+
+
+def _greedy_pick(oa, target_area):
+    """
+    Splits target area over candidate age classes (in order of preference).
+    Returns area to operate in each age class (plain loop for short candidate lists, 
+    where array conversion and jitted call overhead cost more than the loop).
+    """
+    if len(oa) >= _GREEDY_PICK_NJIT_MIN:
+        return _greedy_pick_kernel(np.asarray(oa, dtype=np.float64), target_area)
+    result = []
+    for a in oa:
+        result.append(min(a, target_area) if target_area > 0. else 0.)
+        target_area -= result[-1]
+    return result
+
+
 class GreedyAreaSelector:
     """
     Default AreaSelector implementation. Selects areas for treatment from oldest age classes.
@@ -79,32 +283,38 @@ class GreedyAreaSelector:
         :param bool verbose: Verbosity flag. Defaults to False.
          
         """
-        key = lambda item: max(item[1])
-        odt = sorted(list(self.parent.operable_dtypes(acode, period, mask).items()), key=key)
+        # max-heap on oldest operable age (ties go to last dtype, as with a reversed stable sort)
+        entries = lambda odt: [(-ages[-1], -i, dtk) for i, (dtk, ages) in enumerate(odt.items())]
+        heap = entries(self.parent.operable_dtypes(acode, period, mask))
         if verbose:
-            print(' entering selector.operate()', len(odt), 'operable dtypes')
-        while target_area > 0 and odt:
-            while target_area > 0 and odt:
-                popped = odt.pop()
-                try:
-                    dtk, ages = popped #odt.pop()
-                except:
-                    print(odt)
-                    print(popped)
-                    raise
-                age = sorted(ages)[-1]
-                oa = self.parent.dtypes[dtk].operable_area(acode, period, age)
+            print(' entering selector.operate()', len(heap), 'operable dtypes')
+        while target_area > 0 and heap:
+            # stage oldest operable age class of each dtype (oldest first) until target area is covered,
+            # and split target area over them
+            heapq.heapify(heap)
+            staged, oas, staged_area = [], [], 0.
+            while heap and staged_area < target_area:
+                neg_age, _, dtk = heapq.heappop(heap)
+                staged.append((dtk, -neg_age))
+                oas.append(self.parent.dtypes[dtk].operable_area(acode, period, -neg_age))
+                staged_area += oas[-1]
+            areas = _greedy_pick(oas, target_area)
+            touched = set() # dtypes whose area was changed by actions applied in this stage
+            for (dtk, age), oa, area in zip(staged, oas, areas):
+                if target_area <= 0: break
                 if not oa: continue # nothing to operate
-                area = min(oa, target_area)
+                if dtk in touched and self.parent.dtypes[dtk].operable_area(acode, period, age) != oa:
+                    break # changed by transitions of an action applied above (stage again)
                 target_area -= area
                 if area < 0:
                     print('negative area', area, oa, target_area, acode, period, age)
                     assert False
                 if verbose:
                     print(' selector found area', [' '.join(dtk)], acode, period, age, area)
-                self.parent.apply_action(dtk, acode, period, age, area, compile_c_ycomps=True,
-                                         fuzzy_age=False, recourse_enabled=False, verbose=verbose)
-            odt = sorted(list(self.parent.operable_dtypes(acode, period, mask).items()), key=key)
+                errorcode, _, target_dt = self.parent.apply_action(dtk, acode, period, age, area, compile_c_ycomps=True,
+                                                                   fuzzy_age=False, recourse_enabled=False, verbose=verbose)
+                if not errorcode: touched.update([dtk] + [t[0] for t in target_dt])
+            heap = entries(self.parent.operable_dtypes(acode, period, mask))
         self.parent.commit_actions(period, repair_future_actions=True)
         if verbose:
             print('GreedyAreaSelector.operate done (remaining target_area: %0.1f)' % target_area)
@@ -142,6 +352,14 @@ class DevelopmentType:
     Encapsulates Forest development type data (curves, age, area), and provides methods to operate on the data.
     """
     _bo = {'AND':operator.and_, '&':operator.and_, 'OR':operator.or_, '|':operator.or_}
+    # complex ycomp resolver method names (shared by all instances, rather than a dict of bound methods per instance)
+    _resolvers = {'MULTIPLY':'_resolver_multiply',
+                  'DIVIDE':'_resolver_divide',
+                  'SUM':'_resolver_sum',
+                  'CAI':'_resolver_cai',
+                  'MAI':'_resolver_mai',
+                  'YTP':'_resolver_ytp',
+                  'RANGE':'_resolver_range'}
     
     def __init__(self,
                  key,
@@ -159,24 +377,20 @@ class DevelopmentType:
         self._zero_curve = parent.common_curves['zero']
         self._unit_curve = parent.common_curves['unit']
         self._ages_curve = parent.common_curves['ages']                           
-        self._resolvers = {'MULTIPLY':self._resolver_multiply,
-                           'DIVIDE':self._resolver_divide,
-                           'SUM':self._resolver_sum,
-                           'CAI':self._resolver_cai,
-                           'MAI':self._resolver_mai,
-                           'YTP':self._resolver_ytp,
-                           'RANGE':self._resolver_range}
         self.transitions = {} # keys are (acode, age) tuples
         #######################################################################
         # Use period 0 slot to store starting inventory.
-        self._areas = {p:dd(float) for p in range(0, self.parent.horizon+1)}
+        # Dense (period, age) array, stored as a view into the model-level area tensor.
+        # Age columns past max age hold overflow area (area that grew older than max age keeps
+        # its true age, but is not part of any age class used by outputs).
+        self._areas = parent._new_areas(self)
         #######################################################################
         self.oper_expr = dd(list)
         self.operability = {}        
 
     def operable_ages(self, acode, period):
         """
-        Finds list of ages at which self is operable, given an action code and period index.
+        Finds list of ages (sorted, ascending) at which self is operable, given an action code and period index.
         """
         if acode not in self.oper_expr: # action not defined for this development type
             return None
@@ -187,7 +401,8 @@ class DevelopmentType:
             return None
         else:
             lo, hi = self.operability[acode][period]
-            return list(set(range(lo, hi+1)).intersection(list(self._areas[period].keys())))        
+            lo = max(lo, 0)
+            return (np.flatnonzero(self._areas[period, lo:hi+1]) + lo).tolist()
     
     def is_operable(self, acode, period, age=None, verbose=False):
         """
@@ -223,7 +438,7 @@ class DevelopmentType:
         :param str acode: The action code to determine operability.
         :param int period: The period to determine operability for.
         :param int age: The age to determine operability for. If None, only checks operability for the period.
-        :param bool cleanup: If True (default), removes the age class from the inventory dict if operable area is less than                                 self.parent.area_epsilon.
+        :param bool cleanup: If True (default), zeroes the age class in the inventory if operable area is less than                                 self.parent.area_epsilon.
 
         """
         if acode not in self.oper_expr: # action not defined for this development type
@@ -231,21 +446,24 @@ class DevelopmentType:
         if acode not in self.operability: # action not xf yet...
             if self.compile_action(acode) == -1: return 0. # never operable
         if age is None: # return total operable area
-            return sum(self.operable_area(acode, period, a) for a in list(self._areas[period].keys()))
-        if age not in self._areas[period]:
+            if period not in self.operability[acode]: return 0.
+            lo, hi = self.operability[acode][period]
+            areas = self._areas[period, max(lo, 0):hi+1]
+            negligible = np.abs(areas) < self.parent.area_epsilon
+            if cleanup: areas[negligible] = 0.
+            return float(areas[~negligible].sum())
+        if age < 0 or age >= self._areas.shape[1]:
             # age class not in inventory
             return 0.
-        elif abs(self._areas[period][age]) < self.parent.area_epsilon:
+        area = self._areas[period, age]
+        if abs(area) < self.parent.area_epsilon:
             # negligible area
-            #print 'no area', acode, period, age, self._areas[period][age]
-            #print ' '.join(self.key)
-            #print self._areas[period].keys()
-            if cleanup: # remove ageclass from dict (frees up memory)
-                del self._areas[period][age]
+            if cleanup: # zero out ageclass (drops it from operable ages)
+                self._areas[period, age] = 0.
             return 0.
         elif self.is_operable(acode, period, age):
             #print 'operable', acode, period, age #, self.operability[acode]
-            return self._areas[period][age]
+            return float(area)
         else:
             return 0.
         assert False
@@ -266,38 +484,43 @@ class DevelopmentType:
         :param float area:  The area value to set. If None, returns the area inventory.
         :param bool delta:  If True (default), interprets the area value as an increment on the current inventory. 
                             If False, sets the area value directly.       
+        :raises ValueError: If setting area at a negative age (area set at ages past max age plus 
+                            ``horizon * period_length`` is lumped into the oldest age class, with a warning).
         """
         #if area is not None:
         #    print area
         #    assert area > 0
         if area is None: # return area for period and age
             if age is not None:
-                try:
-                    return self._areas[period][age]
-                except Exception as e:
-                    print(e)
-                    return 0.
+                return float(self._areas[period, age]) if 0 <= age < self._areas.shape[1] else 0.
             else: # return total area
-                return sum(self._areas[period][a] for a in self._areas[period])
+                return float(self._areas[period].sum())
         else: 
+            if age < 0: raise ValueError('negative age: %i' % age)
+            self.parent._ensure_area_age(age)
+            if age >= self._areas.shape[1]:
+                warnings.warn('age %i past last overflow column (max age %i, plus %i years of growth over the horizon), '
+                              'lumped into age %i' % (age, self._max_age, self._areas.shape[1] - self._max_age - 1,
+                                                      self._areas.shape[1] - 1))
+                age = self._areas.shape[1] - 1
             if delta:
-                self._areas[period][age] += area
+                self._areas[period, age] += area
             else:
-                self._areas[period][age] = area
+                self._areas[period, age] = area
         
     def resolve_condition(self, yname, lo, hi):
         """
-        Find lower and upper ages that correspond to lo and hi values of yname (interpreted as first occurence of yield value, reading curve from left and right, respectively).
+        Find ages at which yname value is between lo and hi (inclusive). Returns array of ages.
         """
-        return [x for x, y in enumerate(self.ycomp(yname)) if y >= lo and y <= hi]
+        y = self.ycomp(yname)._as_array()
+        return np.flatnonzero((y >= lo) & (y <= hi))
        
     def reset_areas(self, period=None):
         """
-        Reset areas dictionary.
+        Reset areas array.
         """
         periods = self.parent.periods if period is None else [period]
-        for period in periods:
-            self._areas[period] = dd(float)
+        self._areas[periods] = 0.
 
     def ycomps(self):
         """
@@ -313,9 +536,11 @@ class DevelopmentType:
         :param str yname: The name of the yield to retrieve components for.
         :param bool silent_fail: If True (default), returns None if the yield name is not found. If False, raises a KeyError                                    that yield name is not found.        
         """
-        if yname in self._ycomps:
-            if not self._ycomps[yname]: # complex ycomp not compiled yet
-                self._compile_complex_ycomp(yname)
+        ycomp = self._ycomps.get(yname)
+        if ycomp is not None: # fast path (compiled ycomp)
+            return ycomp
+        if yname in self._ycomps: # complex ycomp not compiled yet
+            self._compile_complex_ycomp(yname)
             return self._ycomps[yname]
         else: # not a valid yname
             if silent_fail:
@@ -334,52 +559,70 @@ class DevelopmentType:
             ycomp = self.ycomp(s)
             return ycomp if ycomp else default_ycomp
         
+    def _args(self, d): # split argument list of complex yield expression
+        return _RE_ARGS.split(_RE_PARENS.search(d).group(0))
+
+    def _ytype(self, args): # common ytype of curve operands ('c' if mixed)
+        ytype = None
+        for a in args:
+            if not isinstance(a, core.Curve): continue
+            if ytype is None:
+                ytype = a.type
+            elif a.type != ytype:
+                return 'c'
+        return ytype if ytype is not None else 'c'
+
     def _resolver_multiply(self, yname, d):
-        args = [self._o(s.lower()) for s in re.split('\s?,\s?', re.search('(?<=\().*(?=\))', d).group(0))]
+        args = [self._o(s.lower()) for s in self._args(d)]
         ##################################################################################################
         # NOTE: Not consistent with Remsoft documentation on 'complex-compound yields' (fix me)...
-        ytype_set = set(a.type for a in args if isinstance(a, core.Curve))
-        return ytype_set.pop() if len(ytype_set) == 1 else 'c', self._rc(reduce(lambda x, y: x*y, args))
+        return self._ytype(args), self._rc(core.Curve.reduce(np.multiply, args))
         ##################################################################################################
 
     def _resolver_divide(self, yname, d):
-        _tmp = list(zip(re.split('\s?,\s?', re.search('(?<=\().*(?=\))', d).group(0)),
+        _tmp = list(zip(self._args(d),
                    (self._zero_curve, self._unit_curve)))
         args = [self._o(s, default_ycomp) for s, default_ycomp in _tmp]
         return args[0].type if not args[0].is_special else args[1].type, self._rc(args[0] / args[1])
         
     def _resolver_sum(self, yname, d):
         #print 'resolving SUM', yname, d
-        args = [self._o(s.lower()) for s in re.split('\s?,\s?', re.search('(?<=\().*(?=\))', d).group(0))] 
-        ytype_set = set(a.type for a in args if isinstance(a, core.Curve))
+        args = [self._o(s.lower()) for s in self._args(d)] 
         #print [a.label, a.type for a in args if isinstance(a, core.Curve)]
-        return ytype_set.pop() if len(ytype_set) == 1 else 'c', self._rc(reduce(lambda x, y: x+y, [a for a in args]))
+        return self._ytype(args), self._rc(core.Curve.sum(args))
         
     def _resolver_cai(self, yname, d):
-        arg = self._o(re.split('\s?,\s?', re.search('(?<=\().*(?=\))', d).group(0))[0])
+        arg = self._o(self._args(d)[0])
         return arg.type, self._rc(arg.mai())
         
     def _resolver_mai(self, yname, d):
-        arg = self._o(re.split('\s?,\s?', re.search('(?<=\().*(?=\))', d).group(0))[0])
+        arg = self._o(self._args(d)[0])
         return arg.type, self._rc(arg.mai())
         
     def _resolver_ytp(self, yname, d):
-        arg = self._o(re.search('(?<=\().*(?=\))', d).group(0).lower())
+        arg = self._o(_RE_PARENS.search(d).group(0).lower())
         return arg.type, self._rc(arg.ytp())
         
     def _resolver_range(self, yname, d):
-        args = [self._o(s.lower()) for s in re.split('\s?,\s?', re.search('(?<=\().*(?=\))', d).group(0))] 
+        args = [self._o(s.lower()) for s in self._args(d)] 
         arg_triplets = [args[i:i+3] for i in range(0, len(args), 3)]
-        range_curve = self._rc(reduce(lambda x, y: x*y, [t[0].range(t[1], t[2]) for t in arg_triplets]))
+        if len(arg_triplets) == 1:
+            range_curve = self._rc(args[0].range(args[1], args[2]))
+        else: # product of 0/1 range curves is the step over the intersection of their bounds
+            bounds = [t[0].range(t[1], t[2], as_bounds=True) for t in arg_triplets]
+            lb, ub = max(b[0] for b in bounds), min(b[1] for b in bounds)
+            xmax = args[0].xmax
+            range_curve = self._rc(core.Curve.step(lb, ub, xmax) if lb <= ub else core.Curve(points=[(0, 0), (xmax, 0)]))
         #print ' '.join(self.key), yname, range_curve.points()
-        return args[0].type, self._rc(reduce(lambda x, y: x*y, [t[0].range(t[1], t[2]) for t in arg_triplets]))
+        return args[0].type, range_curve
 
     def _compile_complex_ycomp(self, yname):
         expression = self._complex_ycomps[yname]
-        keyword = re.search('(?<=_)[A-Z]+(?=\()', expression).group(0)
+        keyword = _RE_KEYWORD.search(expression).group(0)
         #print('compiling complex', yname, keyword, expression)
         try:
-            ytype, ycomp = self._resolvers[keyword](yname, expression)
+            ytype, ycomp = getattr(self, self._resolvers[keyword])(yname, expression)
+            ycomp = copy.copy(ycomp) # registered (and cached) curves are shared, so label a copy
             ycomp.label = yname
             ycomp.type = ytype
             self._ycomps[yname] = ycomp
@@ -397,6 +640,19 @@ class DevelopmentType:
         for acode in self.oper_expr:
             self.compile_action(acode, verbose)
 
+    def set_oper_expr(self, acode, expressions, verbose=False):
+        """
+        Sets operability expressions for an action, and compiles them right away (so the model-level 
+        (action code, period) operability index used by ``ForestModel.operable_dtypes`` stays in sync).
+        Returns -1 if the action is never operable (see ``compile_action``), 0 otherwise.
+
+        :param str acode: The action code.
+        :param list expressions: Operability expression strings.
+        :param bool verbose: Verbosity flag. Defaults to False.
+        """
+        self.oper_expr[acode] = list(expressions)
+        return self.compile_action(acode, verbose)
+
     def compile_action(self, acode, verbose=False):
         """
         Compile action, given action code. 
@@ -411,10 +667,13 @@ class DevelopmentType:
         for expr in self.oper_expr[acode]:
             self._compile_oper_expr(acode, expr, verbose)
         is_operable = False
+        index = self.parent._operable_index
+        for p in self.parent.periods: index.get((acode, p), set()).discard(self.key)
         for p in self.operability[acode]:
             if self.operability[acode][p] is not None:
                 #print 'compile_action', expr, acode, p, self.operability[acode][p]
                 is_operable = True
+                index.setdefault((acode, p), set()).add(self.key)
         if not is_operable:
             if verbose: print('not operable (deleting):', acode)
             del self.operability[acode]
@@ -425,18 +684,33 @@ class DevelopmentType:
         return 0
 
     def _compile_oper_expr(self, acode, expr, verbose=False):
-        expr = expr.replace('&', 'and').replace('|', 'or')
-        oper = None
+        # operability limits only depend on expression, max age, horizon and referenced ycomps
+        # (development types sharing yield curves share the resolved limits)
+        lhs = _parse_oper_expr(expr)[1]
+        ycomps = tuple(self.ycomp(o) for o in lhs if o not in ('_cp', '_age'))
+        if all(c is None or c.is_locked for c in ycomps): # (unlocked curves have no content key)
+            key = (expr, self._max_age, self.parent.horizon) + tuple(c and c._key() for c in ycomps)
+            cache = self.parent._oper_expr_cache
+            if key not in cache: cache[key] = self._resolve_oper_expr(expr)
+            plo, phi, alo, ahi = cache[key]
+        else:
+            plo, phi, alo, ahi = self._resolve_oper_expr(expr)
+        assert plo <= phi # should never explicitly declare infeasible period range...
+        for p in range(plo, phi+1):
+            assert alo <= ahi
+            #print self.key, acode, p, alo, ahi
+            self.operability[acode][p] = (alo, ahi) if alo <= ahi else None
+            #print acode, p, (alo, ahi), expr
+
+    def _resolve_oper_expr(self, expr):
+        """
+        Resolves operability expression into (plo, phi, alo, ahi) period and age limits.
+        """
+        oper, lhs, rel_operators, rhs = _parse_oper_expr(expr)
         plo, phi = 1, self.parent.horizon # count periods from 1, as in Forest...
         alo, ahi = 0, self._max_age 
-        if 'and' in expr:
-            oper = 'and'
-        elif 'or' in expr:
-            oper = 'or'
+        if oper == 'or':
             alo, ahi = self._max_age+1, -1
-        cond_comps = expr.split(' %s ' % oper)
-        lhs, rel_operators, rhs = list(zip(*[cc.split(' ') for cc in cond_comps]))
-        rhs = list(map(float, rhs))
         _plo, _phi, _alo, _ahi = None, None, None, None
         for i, o in enumerate(lhs):
             if o == '_cp':
@@ -452,7 +726,7 @@ class DevelopmentType:
                     _plo, _phi = period, period
                 elif rel_operators[i] == '>=':
                     _plo = period
-                elif rel_opertors[i] == '<=':
+                elif rel_operators[i] == '<=':
                     _phi = period
                 else:
                     raise ValueError('Bad relational operator.')
@@ -488,12 +762,7 @@ class DevelopmentType:
             if _ahi is not None: ahi = max(_ahi, ahi)
         #if plo >= phi:
         #    print(plo, phi)
-        assert plo <= phi # should never explicitly declare infeasible period range...
-        for p in range(plo, phi+1):
-            assert alo <= ahi
-            #print self.key, acode, p, alo, ahi
-            self.operability[acode][p] = (alo, ahi) if alo <= ahi else None
-            #print acode, p, (alo, ahi), expr
+        return plo, phi, alo, ahi
             
                 
     def add_ycomp(self, ytype, yname, ycomp, first_match=True):
@@ -526,24 +795,21 @@ class DevelopmentType:
         """
         
         end_period = start_period + 1 if not cascade else self.parent.horizon
-        for p in range(start_period, end_period):
-            self.reset_areas(p+1) #, self._areas[p], self._areas[p+1] # WTF?
-            #for age, area in list(self._areas[p].items()): self._areas[p+1][age+1] = area
-            for age, area in list(self._areas[p].items()): self._areas[p+1][age+self.parent.period_length] = area
+        _grow_areas(self._areas, start_period, end_period, self.parent.period_length)
 
     def overwrite_initial_areas(self, period):
 
         """
         Overwrites the initial areas for a specified period.   
         """
-        self._areas[0] = copy.copy(self._areas[period])
+        self._areas[0] = self._areas[period]
         self.initialize_areas()
             
     def initialize_areas(self):
         """
         Copy initial inventory to period-1 inventory.
         """
-        self._areas[1] = copy.copy(self._areas[0])
+        np.copyto(self._areas[1], self._areas[0])
         
 class Output:
     """
@@ -636,7 +902,7 @@ class Output:
 
     def _compile_basic(self, expression):
         # clean up (makes parsing easier)
-        s = re.sub('\s+', ' ', expression) # separate tokens by single space
+        s = _RE_WS.sub(' ', expression) # separate tokens by single space
         s = s.replace(' (', '(')  # remove space to left of left parentheses
         t = s.lower().split(' ')
         # filter dtypes, if starts with mask
@@ -686,47 +952,52 @@ class Output:
     def _evaluate_basic(self, period, factors, verbose=0, cut_corners=True):
         result = 0.
         if self._invent_acodes:
-            acodes = [acode for acode in self._invent_acodes if parent.applied_actions[period][acode]]
+            acodes = [acode for acode in self._invent_acodes if self.parent.applied_actions[period].get(acode)]
             if cut_corners and not acodes:
                 return 0. # area will be 0...
-        for k in list(self.parent.dtypes.keys()):
-            dt = self.parent.dtypes[k]
-            if cut_corners and not self._is_invent and k not in self.parent.applied_actions[period][self._acode]:
+        operated = self.parent.applied_actions[period].get(self._acode, {}) # read-only probe (no side effects)
+        f_const, ycomp_factors = 1., [] # constant factors do not depend on dtype (multiply them once)
+        for factor in [self._factor] + factors:
+            if isinstance(factor[0], float):
+                f_const *= pow(*factor)
+            else:
+                ycomp_factors.append(factor)
+        if cut_corners and not f_const:
+            return 0. # constant factor is 0, no point looping over dtypes...
+        # bind loop invariants locally (the loop below runs once per development type)
+        skip_unoperated = cut_corners and not self._is_invent
+        condition, is_area, yname = self._condition, self._is_area, self._ycomp
+        static_ages = None if condition else np.asarray(self._ages, dtype=int)
+        invent_acodes = acodes if self._invent_acodes else None
+        for k, dt in list(self.parent.dtypes.items()):
+            if skip_unoperated and k not in operated:
                 if verbose: print('bailing on', period, self._acode, ' '.join(k))
                 continue # area will be 0...
-            if isinstance(self._factor[0], float):
-                f = pow(*self._factor)
-            else:
-                f = pow(dt.ycomp(self._factor[0])[period], self._factor[1])
-            for factor in factors:
-                if isinstance(factor[0], float):
-                    f *= pow(*factor)
-                else:
-                    f *= pow(dt.ycomp(factor[0])[period], factor[0])
+            dt_ycomp = dt.ycomp
+            f = f_const
+            for _yname, exponent in ycomp_factors:
+                f *= pow(dt_ycomp(_yname)[period], exponent)
             if cut_corners and not f:
                 if verbose: print('f is null', f)
                 continue # one of the factors is 0, no point calculating area...
-            ages = self._ages if not self._condition else dt.resolve_condition(*self._condition)
-            for age in ages:
-                area = 0.
-                if self._is_invent:
-                    if cut_corners and not dt.area(period, age):
-                        continue
-                    if self._invent_acodes:
-                        any_operable = False
-                        for acode in acodes:
-                            if acode not in dt.operability: continue
-                            if dt.is_operable(acode, period, age):
-                                any_operable = True
-                        if any_operable:
-                            area += dt.area(period, age)
-                    else:
-                        area += dt.area(period, age)
-                else:
-                    assert False # not implemented yet...
-                y = 1. if self._is_area else dt.ycomp(self._ycomp)[age]
-                result += y * area * f
-        return result
+            ages = static_ages if static_ages is not None else np.asarray(dt.resolve_condition(*condition), dtype=int)
+            if not ages.size: continue # no age classes (nothing to evaluate)
+            if not self._is_invent:
+                assert False # not implemented yet...
+            ages = ages[(ages >= 0) & (ages <= min(dt._max_age, dt._areas.shape[1] - 1))] # no inventory outside age range
+            area = dt._areas[period, ages]
+            if invent_acodes is not None:
+                is_operable = np.zeros(ages.size, dtype=bool)
+                for acode in invent_acodes:
+                    if acode not in dt.operability: continue
+                    bounds = dt.operability[acode].get(period)
+                    if bounds: is_operable |= (ages >= bounds[0]) & (ages <= bounds[1])
+                area = area * is_operable
+            if is_area:
+                result += area.sum() * f
+            else:
+                result += np.dot(area, dt_ycomp(yname)._as_array()[ages]) * f
+        return float(result)
 
     def _evaluate_summary(self, period, factors):
         result = 0.
@@ -760,6 +1031,55 @@ class Output:
         else:
             return self() - other()
 
+class _DtypeDict(dict):
+    """
+    Development type dict that counts its mutations, so indexes and caches derived from it 
+    (see ``ForestModel.unmask``) can tell when they are stale. ``version`` changes on every mutation,
+    ``layout`` only on mutations other than inserting a new key (removing or replacing development types),
+    after which derived indexes must be rebuilt from scratch (rather than extended with new keys).
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = self.layout = 0
+
+    def _changed(self, insert=False):
+        self.version += 1
+        if not insert: self.layout += 1
+
+    def __setitem__(self, key, value):
+        self._changed(insert=key not in self)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed()
+
+    def pop(self, *args):
+        result = super().pop(*args)
+        self._changed()
+        return result
+
+    def popitem(self):
+        result = super().popitem()
+        self._changed()
+        return result
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items(): self[key] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def setdefault(self, key, default=None):
+        if key not in self: self[key] = default
+        return self[key]
+
+
 class ForestModel:
     """
     This is the core class of the ws3 package.
@@ -784,7 +1104,6 @@ class ForestModel:
     a larger modelling pipeline).  
     """
     _ytypes = {'*Y':'a', '*YT':'t', '*YC':'c'}
-    tree = (lambda f: f(f))(lambda a: (lambda: dd(a(a))))
     #_vp_ratio_default = 1.
     #_piece_size_yname_default = 'yd3s'
     #_piece_size_factor_default = 0.001 # convert cubic decimeters to cubic meters
@@ -838,6 +1157,16 @@ class ForestModel:
         self._themes = []
         self._theme_basecodes = []
         self.dtypes = {}
+        self._area_dtypes = [] # development types, in area tensor order
+        self._area_age_hi = 0 # age axis of area tensor covers ages 0 to this (plus growth over the horizon)
+        self._area_tensor = np.zeros((0, self.horizon+1, self._n_age_columns()))
+        self._operable_index = {} # (acode, period) -> set of keys of dtypes with operability limits
+        self._oper_expr_cache = {} # resolved operability limits (see DevelopmentType._compile_oper_expr)
+        self._unmask_cache = {} # mask -> matching dtype keys (reset when themes or dtypes change)
+        self._theme_expansions = {} # (theme index, theme code) -> set of basecodes (reset when themes change)
+        self._mask_orders = {} # mask -> (theme index, basecode set) pairs, most selective first (reset when themes change)
+        self._keys_by_theme = dd(lambda: dd(set)) # theme index -> theme basecode -> dtype keys
+        self._dtype_pos = {} # dtype key -> position in self.dtypes
         self.constants = {}
         self.output_groups = {}
         self.outputs = {}
@@ -892,13 +1221,76 @@ class ForestModel:
         """
         self.horizon = int(horizon)
         self.periods = list(range(1, horizon+1))
+        if getattr(self, '_area_dtypes', None): # resize area inventory of existing development types
+            self._alloc_area_tensor(len(self._area_tensor))
+
+    def _n_age_columns(self, age=None):
+        """
+        Returns width of the age axis of the area tensor needed to hold area at ``age`` (defaults to oldest 
+        age written so far, capped at max age), plus overflow columns for that area to keep growing 
+        (past max age, if need be) over the planning horizon.
+        """
+        age = self._area_age_hi if age is None else age
+        return min(age, self.max_age) + 1 + self.horizon * self.period_length
+
+    def _ensure_area_age(self, age):
+        """
+        Widens the age axis of the area tensor (if needed) so it can hold area at ``age``.
+        The axis is widened geometrically (capped at max age), so writing ages in ascending order
+        only reallocates a few times.
+        """
+        if self._n_age_columns(age) <= self._area_tensor.shape[2]: return
+        self._area_age_hi = min(max(age, self._area_age_hi * 3 // 2), self.max_age)
+        self._alloc_area_tensor(len(self._area_tensor))
+
+    def _alloc_area_tensor(self, capacity):
+        """
+        (Re)allocates model-level (development type, period, age) area tensor.
+
+        The tensor is dense float64, so it uses ``8 * (horizon + 1) * n_age_columns`` bytes per development 
+        type slot, where ``n_age_columns`` is the oldest age written to the inventory (capped at max age), 
+        plus one, plus ``horizon * period_length`` overflow columns (see ``_n_age_columns``). Only ages 
+        that can actually occur are allocated (for example, an inventory with stands up to age 250 and 
+        a 30 period horizon, with 10 year periods, uses 551 age columns, about 133 KB per development type).
+
+        ``DevelopmentType._areas`` arrays are views into this tensor. Every reallocation (new 
+        development type past capacity, new oldest age, or new horizon) rebinds them to the new tensor,
+        so views of ``dt._areas`` or ``ForestModel._areas()`` taken earlier are stale (writes to them are lost).
+        Do not hold on to such views across calls that may create development types or add area.
+        """
+        tensor = np.zeros((capacity, self.horizon+1, self._n_age_columns()))
+        n = len(self._area_dtypes)
+        if n:
+            h = min(self._area_tensor.shape[1], tensor.shape[1])
+            w = min(self._area_tensor.shape[2], tensor.shape[2])
+            tensor[:n, :h, :w] = self._area_tensor[:n, :h, :w]
+        self._area_tensor = tensor
+        for i, dt in enumerate(self._area_dtypes): dt._areas = tensor[i]
+
+    def _new_areas(self, dt):
+        """
+        Returns a new (period, age) area array for development type (slot in the model-level area tensor).
+        Capacity grows geometrically, in chunks of ``_AREA_TENSOR_CHUNK_MIN`` to ``_AREA_TENSOR_CHUNK_MAX`` slots
+        (bounds memory overshoot on large models, at the cost of a few more reallocations).
+        """
+        n = len(self._area_dtypes)
+        if n == len(self._area_tensor): 
+            self._alloc_area_tensor(n + min(max(n // 2, _AREA_TENSOR_CHUNK_MIN), _AREA_TENSOR_CHUNK_MAX))
+        self._area_dtypes.append(dt)
+        return self._area_tensor[n]
+
+    def _areas(self):
+        """
+        Returns (development type, period, age) area tensor view (stale after reallocation, see ``_alloc_area_tensor``).
+        """
+        return self._area_tensor[:len(self._area_dtypes)]
         
         
     def compile_actions(self, mask=None, verbose=False):
         """
         Compile actions for the development types filtered by mask.
         """
-        dtype_keys = self.unmask(mask) if mask else list(self.dtypes.keys())
+        dtype_keys = self.unmask(mask) if mask else self.dtypes
         for dtk in dtype_keys:
             dt = self.dtypes[dtk]
             dt.compile_actions(verbose=verbose)            
@@ -1072,7 +1464,7 @@ class ForestModel:
     def _bld_tree_m1(self, area, dtk, age, coeff_funcs, tree=None, period=1, acodes=None, compile_c_ycomps=True):
         if not tree:
             self.reset_areas()
-            self.dtypes[dtk]._areas[1][age] = area
+            self.dtypes[dtk].area(1, age, area, delta=False)
             self.reset_actions()
             tree = common.Tree()
         acodes = list(self.actions.keys()) if not acodes else acodes
@@ -1111,7 +1503,7 @@ class ForestModel:
         for dtk in list(dtype_keys):
             self.reset()
             dt = self.dtypes[dtk]
-            for age in list(dt._areas[1].keys()):
+            for age in np.flatnonzero(dt._areas[1]).tolist():
                 self.reset()
                 if not dt.area(1, age): continue
                 i = (dt.key, age)
@@ -1139,7 +1531,7 @@ class ForestModel:
         self.oper_expr[acode] = {mask:oe}
         self.transitions[acode] = {mask:{'':target}}
         for dtk in self.dtypes:
-            self.dtypes[dtk].oper_expr[acode] = [oe]
+            self.dtypes[dtk].set_oper_expr(acode, [oe])
             self.dtypes[dtk].transitions[acode, -1] = target
             #for age in range(self.dtypes[dtk]._max_age):
             #    self.dtypes[dtk].transitions[acode, age] = target
@@ -1164,7 +1556,7 @@ class ForestModel:
         """
         try:
             return self.dtypes[dtype_key]
-        except:
+        except KeyError:
             return None
 
     def age_class_distribution(self, period, mask=None, omit_null=False):
@@ -1177,12 +1569,17 @@ class ForestModel:
 
         :return: A dictionary where keys are ages and values are the corresponding area distributions.
         """
-        result = {age:0. for age in self.ages}
-        dtype_keys = self.unmask(mask) if mask else list(self.dtypes.keys())
-        for dtk in dtype_keys:
-            dt = self.dtypes[dtk]
-            for age in dt._areas[period]:
-                result[age] += dt._areas[period][age]
+        if mask:
+            areas = np.zeros(self._area_tensor.shape[2])
+            for dtk in self.unmask(mask):
+                areas += self.dtypes[dtk]._areas[period]
+        else: # all development types (sum over area tensor)
+            areas = self._areas()[:, period].sum(axis=0)
+        if areas.size < len(self.ages): # (age axis only covers ages written to the inventory so far)
+            areas = np.concatenate((areas, np.zeros(len(self.ages) - areas.size)))
+        result = dict(zip(self.ages, areas.tolist()))
+        for age in np.flatnonzero(areas[len(self.ages):]) + len(self.ages): # area older than max age
+            result[int(age)] = float(areas[age])
         if omit_null:
             result = {k:v for k, v in result.items() if v}
         return result
@@ -1190,10 +1587,22 @@ class ForestModel:
     def operable_dtypes(self, acode, period, mask=None):
         """
         Returns dict (keyed on development type key, values are lists of operable ages).
+
+        Only looks at development types in the (action code, period) operability index, which is updated 
+        whenever operability expressions are compiled (set them with ``DevelopmentType.set_oper_expr``, or call
+        ``DevelopmentType.compile_action`` after changing ``DevelopmentType.oper_expr`` directly). 
+        The index only depends on operability limits (areas are read when the index is queried, 
+        so it does not need refreshing when areas change).
         """
         result = {}
-        dtype_keys = self.unmask(mask) if mask else list(self.dtypes.keys())
-        for dtk in dtype_keys:
+        candidates = self._operable_index.get((acode, period))
+        if not candidates: return result
+        if mask: 
+            candidates = candidates.intersection(self.unmask(mask))
+        else:
+            self._update_theme_index()
+        candidates = [dtk for dtk in candidates if dtk in self._dtype_pos] # (skip removed dtypes)
+        for dtk in sorted(candidates, key=self._dtype_pos.__getitem__): # (same order as self.dtypes)
             dt = self.dtypes[dtk]
             operable_ages = dt.operable_ages(acode, period)
             if operable_ages:
@@ -1214,32 +1623,40 @@ class ForestModel:
         elif dtype_keys:
             _dtype_keys = dtype_keys
         else:
-            _dtype_keys = list(self.dtypes.keys())
+            _dtype_keys = self.dtypes
         #print len(_dtype_keys)
         for dtk in _dtype_keys:
             dt = self.dtypes[dtk]
-            ycomp = dt.ycomp(yname) if yname else {a:1. for a in dt._areas[period]}
+            areas = dt._areas[period]
+            if yname:
+                ycomp = dt.ycomp(yname)
+                if not ycomp: continue # missing ycomp (no contribution)
+                y = ycomp._as_array()
             if age is not None:
-                #print dtk
-                #print dt._areas[period]
-                #print age, yname, ycomp
-                result += dt.area(period, age) * ycomp[age] if age in dt._areas[period] else 0. 
+                if not 0 <= age < areas.size or not areas[age]: continue
+                if yname and age >= y.size: continue # (past end of yield curve)
+                result += float(areas[age] * y[age]) if yname else float(areas[age])
+            elif yname:
+                n = min(areas.size, y.size)
+                result += float(np.dot(areas[:n], y[:n]))
             else:
-                result += sum(dt.area(period, a) * ycomp[a] for a in dt._areas[period]) if ycomp else 0.
+                result += float(areas.sum())
         return result
         
     def operable_area(self, acode, period, age=None, mask=None):
         """
         Returns total operable area, given action code and period (and optionally age).
         """
-        dtype_keys = list(self.dtypes.keys()) if not mask else self.unmask(mask)
+        dtype_keys = self.dtypes if not mask else self.unmask(mask)
         return sum(self.dtypes[dtk].operable_area(acode, period, age) for dtk in dtype_keys)
 
     def overwrite_initial_areas(self, period):
         """
         Overwrites the initial areas for all development types for the specified period.
         """
-        for dt in list(self.dtypes.values()): dt.overwrite_initial_areas(period)
+        areas = self._areas()
+        areas[:, 0] = areas[:, period]
+        areas[:, 1] = areas[:, 0]
     
     def initialize_areas(self, reset_areas=True):
         """
@@ -1247,30 +1664,27 @@ class ForestModel:
         """
         if reset_areas: self.reset_areas()
         #for dt in list(self.dtypes.values()): dt.initialize_areas()
-        for dtk in self.dtypes: self.dtypes[dtk].initialize_areas()
+        areas = self._areas()
+        areas[:, 1] = areas[:, 0]
         
     def reset_areas(self, period=None):
         """
         Reset areas for all development types.        
         """
-        for dtk in self.dtypes: self.dtypes[dtk].reset_areas(period)
+        self._areas()[:, self.periods if period is None else [period]] = 0.
         
     def register_curve(self, curve):
         """
         Add curve to global curve hash map (uses result of Curve.points() to construct hash key). 
         """
         key = tuple(curve.points())
-        if key not in self.curves:
+        _curve = self.curves.get(key)
+        if _curve is None:
             # new curve (lock and register)
-            curve.is_locked = True # points list must not change, else not valid key
-            self.curves[key] = curve
-        return self.curves[key]
+            curve.lock() # points list must not change, else not valid key
+            _curve = self.curves[key] = curve
+        return _curve
             
-    # def _rdd(self):
-    #     """
-    #     Recursive defaultdict (i.e., tree)
-    #     """
-    #     return dd(self._rdd)   
     
     def reset_actions(self, period=None, acode=None, override_sticky=False):
         """
@@ -1281,10 +1695,10 @@ class ForestModel:
         periods = [period] if period else self.periods
         acodes = [acode] if acode else list(self.actions.keys())
         for p in periods:
-            if p not in self.applied_actions: self.applied_actions[p] = {}
+            applied_actions = self.applied_actions.setdefault(p, {})
             for a in acodes:
                 if a in self.actions and self.actions[a].is_sticky and not override_sticky: continue
-                self.applied_actions[p][a] = {} 
+                applied_actions[a] = {} 
 
     # def reset_actions(self, period=None, acode=None):
     #     """
@@ -1301,17 +1715,6 @@ class ForestModel:
     #             assert period is not None
     #             self.applied_actions[period][acode] = {}
 
-    # def reset_actions(self, period=None, acode=None):
-    #     if period is None:
-    #         self.applied_actions = {p:self._rdd() for p in self.periods}
-    #     else:
-    #         if acode is None:
-    #             # NOTE: This DOES NOT deal with consequences in future periods...
-    #             self.applied_actions[period] = self._rdd()
-    #         else:
-    #             assert period is not None
-    #             self.applied_actions[period][acode] = self._rdd()
-
     def compile_product(self,
                         period,
                         expr,
@@ -1333,44 +1736,33 @@ class ForestModel:
         #    pass
         else:# elif type(acode) == str: 
             acodes = [acode] if not self.actions[acode].components else self.actions[acode].components
-        tokens = expr.split(' ')
+        code, ynames = _compile_product_expr(expr, frozenset(self.ynames))
+        _globals = globals()
         result = 0.
         for _acode in acodes:
             #if not aa[period][_acode]: continue # acode not in solution
-            if _acode not in list(aa[period].keys()): continue # acode not in solution
-            _dtype_keys = list(aa[period][_acode].keys()) if dtype_keys is None else dtype_keys
+            if _acode not in aa[period]: continue # acode not in solution
+            _aa = aa[period][_acode]
+            _dtype_keys = list(_aa) if dtype_keys is None else dtype_keys
             #print 'compile_product len(dtype_keys)', len(dtype_keys)
-            #keep = 0
-            #skip = 0
             for dtk in _dtype_keys:
                 #print dtk
-                if dtk not in list(aa[period][_acode].keys()):
-                    #skip += 1
-                    #if verbose: print len(aa[period][_acode].keys()), dtk 
-                    continue
-                #keep += 1
-                ages = list(aa[period][_acode][dtk].keys()) if age is None else [age]
+                if dtk not in _aa: continue
+                ages = list(_aa[dtk]) if age is None else [age]
                 for _age in ages:
-                    aaa = aa[period][_acode][dtk][_age]
+                    aaa = _aa[dtk][_age]
                     #print aaa
-                    _tokens = []
-                    for token in tokens:
-                        if token in self.ynames: # found reference to ycomp
-                            if token in aaa[1]: # token is yname in products (replace with value)
-                                _tokens.append(str(aaa[1][token]))
-                            else: # assume null value if ycomp exists but not stored in solution
-                                _tokens.append('0.')
-                        else:
-                            _tokens.append(token)
-                    _expr = ' '.join(_tokens)
+                    # ycomp references take value from products (assume null value if not stored in solution)
+                    values = {'_y%i' % i:aaa[1].get(yname, 0.) for i, yname in enumerate(ynames)}
                     area = aaa[0] if not coeff else 1.
                     try:
-                        result += eval(_expr) * area
+                        result += eval(code, _globals, values) * area
                     except ZeroDivisionError:
                         pass # let this one go...
-                    except:
+                    except Exception:
                         print(("Unexpected error:", sys.exc_info()[0]))
-                        print("evaluating expression '%s' for case:" % ' '.join(_tokens), period, [' '.join(dtk)], _acode, _age)
+                        print("evaluating expression '%s' for case:" % expr, dict(zip(ynames, values.values())),
+                              period, [' '.join(dtk)], _acode, _age)
                         raise
 
             #print _acode, 'keep', keep, 'skip', skip
@@ -1384,12 +1776,14 @@ class ForestModel:
         acodes = [acode] if not self.actions[acode].components else self.actions[acode].components
         result = 0.
         for _acode in acodes:
-            if not aa[period][_acode]: continue # acode not in solution
-            dtype_keys = list(aa[period][_acode].keys()) if dtype_key is None else [dtype_key]
+            _aa = aa[period][_acode]
+            if not _aa: continue # acode not in solution
+            dtype_keys = list(_aa) if dtype_key is None else [dtype_key]
             for _dtype_key in dtype_keys:
-                ages = list(aa[period][_acode][_dtype_key].keys()) if age is None else [age]
-                for _age in ages:
-                    result += aa[period][_acode][_dtype_key][_age][0]
+                if age is None:
+                    result += sum(aaa[0] for aaa in _aa[_dtype_key].values())
+                else:
+                    result += _aa[_dtype_key][age][0]
         return result
 
     def repair_actions(self, period, areaselector=None, verbose=False):
@@ -1430,15 +1824,20 @@ class ForestModel:
         Commits applied actions (i.e., apply transitions and grow, default starting at period 1).
         By default, will attempt to repair broken (infeasible) future actions, attempting to replace infeasiblea operated area using default AreaSelector.  
         """
+        if not repair_future_actions:
+            # future actions are simply discarded, so grow all remaining periods in one pass
+            if period >= self.horizon: return
+            if verbose: print('growing periods', period, 'to', self.horizon - 1)
+            self.grow(period, cascade=True)
+            for p in range(period + 1, self.horizon + 1):
+                self.reset_actions(p)
+            return
         while period < self.horizon:
             if verbose: print('growing period', period)
             self.grow(period, cascade=False)
             period += 1
-            if repair_future_actions:
-                if verbose: print('repairing actions in period', period)
-                self.repair_actions(period)
-            else:
-                self.reset_actions(period)
+            if verbose: print('repairing actions in period', period)
+            self.repair_actions(period)
 
     def resolve_replace(self, dtk, expr):
         """
@@ -1448,13 +1847,16 @@ class ForestModel:
         # HACK ####################################################################
         # Too lazy to implement all the use cases.
         # This should work OK for BFEC models (TO DO: confirm).
-        tokens = re.split('\s+', expr)
+        parsed = _parse_replace_expr(expr)
+        if parsed: # common _THi [+- k] case (integer arithmetic on theme value)
+            i, offset = parsed
+            return sys.intern(str(int(dtk[i]) + offset)) if offset else dtk[i]
+        tokens = _RE_WS.split(expr)
         i = int(tokens[0][3]) - 1
         try:
             return str(eval(expr.replace(tokens[0], dtk[i])))
-        except:
-            print('source', ' '.join(dtype_key))
-            print('target', ' '.join(tmask), tprop, tage, tlock, treplace, tappend)
+        except Exception:
+            print('replace', expr)
             print('dtk', ' '.join(dtk))
             raise
         
@@ -1480,7 +1882,7 @@ class ForestModel:
                 print('yield-based age definition', tyield, self.dt(dtk).ycomp(tyield[0]).lookup(tyield[1], roundx=True))
             try:
                 targetage = self.dt(dtk).ycomp(tyield[0]).lookup(tyield[1], roundx=True)
-            except:
+            except Exception:
                 print(' '.join(dtk), tyield[0], self.dt(dtk).ycomps())
                 assert False
         elif tage is not None: # target age override specifed in transition
@@ -1617,7 +2019,7 @@ class ForestModel:
             dtk = list(dtype_key) # start with source key
             ###########################################################################
             # DO TO: Confirm correct order for evaluating mask, _APPEND and _REPLACE...
-            dtk = [t if tmask[i] == '?' else tmask[i] for i, t in enumerate(dtk)] 
+            for i, v in _mask_fixed(tmask): dtk[i] = v
             if treplace: dtk[treplace[0]] = self.resolve_replace(dtk, treplace[1])
             if tappend: dtk[tappend[0]] = self.resolve_append(dtk, tappend[1])
             dtk = tuple(dtk)
@@ -1626,10 +2028,9 @@ class ForestModel:
             targetage = self.resolve_targetage(dtk, tyield, age, tage, acode)
             _dt.area(period, targetage, area*tprop)
             target_dt.append([dtk, tprop, targetage])
-        aa = self.applied_actions[period][acode]
-        if dtype_key not in aa: aa[dtype_key] = {}
-        if age not in aa[dtype_key]: aa[dtype_key][age] = [0., {}]
-        aa[dtype_key][age][0] += area
+        aaa = self.applied_actions[period][acode].setdefault(dtype_key, {}).setdefault(age, [0., {}])
+        aaa[0] += area
+        products = aaa[1]
         for yname in dt.ycomps():
             ycomp = dt.ycomp(yname)
             if ycomp.type == 't' and not compile_t_ycomps: continue # skip time-indexed ycomps
@@ -1638,12 +2039,10 @@ class ForestModel:
                 value = 0.
                 for dtk, tprop, targetage in target_dt:
                     _dt = self.dtypes[dtk]
-                    _value = 0.
-                    if yname in dt.ycomps():
-                        if yname in _dt.ycomps():
-                            _value = (dt.ycomp(yname)[age] - _dt.ycomp(yname)[targetage])
-                        else:
-                            _value = dt.ycomp(yname)[age]
+                    if yname in _dt._ycomps:
+                        _value = (ycomp[age] - _dt.ycomp(yname)[targetage])
+                    else:
+                        _value = ycomp[age]
                     if _value > 0.:
                         value += _value * tprop
                     else:
@@ -1654,9 +2053,9 @@ class ForestModel:
                                 print(' ', ''.join(dtk), targetage)
                                 print()
             else: # not partial
-                value = dt.ycomp(yname)[age]
+                value = ycomp[age]
             if value != 0.:
-                aa[dtype_key][age][1][yname] = value
+                products[yname] = value
         return 0, missing_area, target_dt
 
     
@@ -1688,9 +2087,8 @@ class ForestModel:
                     dt.add_ycomp(t, yname, ycomp)
         # assign actions and transitions
         for acode in self.oper_expr:
-            for mask in self.oper_expr[acode]:
-                if self.match_mask(mask, key):
-                    dt.oper_expr[acode].append(self.oper_expr[acode][mask]) 
+            expressions = [e for mask, e in self.oper_expr[acode].items() if self.match_mask(mask, key)]
+            if expressions: dt.set_oper_expr(acode, expressions)
             for mask in self.transitions[acode]:
                 if self.match_mask(mask, key):
                     for scond in self.transitions[acode][mask]:
@@ -1703,17 +2101,17 @@ class ForestModel:
     def _resolve_outputs_buffer(self, s, for_flag=None):
         n = self.nthemes()
         group = 'no_group' # outputs declared at top of file assigned to 'no_group'
-        self.output_groups[group] = set()
+        self.output_groups.setdefault(group, set())
         ocode = ''
         buffering_for = False
-        s = re.sub(r'\{.*?\}', '', s, flags=re.M|re.S) # remove curly-bracket comments
-        for l in re.split(r'[\r\n]+', s, flags=re.M|re.S):
-            if re.match('^\s*(;|$)', l): continue # skip comments and blank lines
-            matches = re.findall('#[A-Za-z0-9_]*', l)
+        s = _RE_CURLY.sub('', s) # remove curly-bracket comments
+        for l in _RE_NEWLINE.split(s):
+            if _is_comment(l): continue # skip comments and blank lines
+            matches = _RE_CONSTANT.findall(l)
             for m in matches: # replace CONSTANTS variables with value
                 try:
                     l = l.replace(m, str(self.constants[m[1:].lower()]))
-                except:
+                except KeyError:
                     import sys
                     print(sys.exc_info()[0])
                     print(l)
@@ -1722,15 +2120,15 @@ class ForestModel:
 
             if buffering_for:
                 if l.strip().startswith('ENDFOR'):
+                    parts = '\n'.join(for_buffer).split(for_var) # split loop body on loop variable once
                     for i in range(for_lo, for_hi+1):
-                        ss = '\n'.join(for_buffer).replace(for_var, str(i))
-                        self._resolve_outputs_buffer(ss, for_flag=i)
+                        self._resolve_outputs_buffer(str(i).join(parts), for_flag=i)
                     buffering_for = False
                     continue
                 else:
                     for_buffer.append(l)
                     continue
-            l = re.sub('\s+', ' ', l) # separate tokens by single space
+            l = ' '.join(l.split()) # separate tokens by single space
             l = l.strip().partition(';')[0].strip()
             l = l.replace(' (', '(')  # remove space to left of left parentheses
             t = l.lower().split(' ')
@@ -1744,7 +2142,7 @@ class ForestModel:
             if l.startswith('*GROUP'):
                 keyword = 'group'
                 group = tokens[1].lower()
-                self.output_groups[group] = set()
+                self.output_groups.setdefault(group, set())
             elif l.startswith('FOR'):
                 # pattern matching may not be very robust, but works for now with:
                 # 'FOR XX := 1 to 99'
@@ -1807,12 +2205,16 @@ class ForestModel:
 
 
         
+        self._unmask_cache.clear()
+        self._theme_expansions.clear()
+        self._mask_orders.clear()
         self._themes.append({})
         #self.nthemes +- 1
         self._themes[-1]['__name__'] = name
         self._themes[-1]['__description__'] = description
         if basecodes: self._theme_basecodes.append([])
         for c in basecodes:
+            c = sys.intern(c)
             self._themes[-1][c] = c
             self._theme_basecodes[-1].append(c)
         for c in aggs:            
@@ -1823,6 +2225,9 @@ class ForestModel:
         """
         Imports LANDSCAPE section from a Forest model.
         """
+        self._unmask_cache.clear()
+        self._theme_expansions.clear()
+        self._mask_orders.clear()
         with open('%s/%s.%s' % (self.model_path, self.model_name, filename_suffix)) as f:
             data = f.read()
         _data = re.search(r'\*THEME.*', data, re.M|re.S).group(0) # strip leading junk
@@ -1833,18 +2238,18 @@ class ForestModel:
             self._themes[-1]['__description__'] = '' # TO DO: extract comments in theme declaration
             self._theme_basecodes.append([])
             defining_aggregates = False
-            for l in [l for l in t.split('\n') if not re.match('^\s*(;|{|$)', l)]: 
-                if re.match('^\s*\*AGGREGATE', l): # aggregate theme attribute code
-                    tac = re.split('\s+', l.strip())[1].lower()
+            for l in [l for l in t.split('\n') if not _RE_COMMENT_CURLY.match(l)]: 
+                if _RE_AGGREGATE.match(l): # aggregate theme attribute code
+                    tac = l.split()[1].lower()
                     self._themes[ti][tac] = []
                     defining_aggregates = True
                     continue
                 if not defining_aggregates: # line defines basic theme attribute code
-                    tac = re.search('\S+', l.strip()).group(0).lower()
+                    tac = sys.intern(re.search(r'\S+', l.strip()).group(0).lower())
                     self._themes[ti][tac] = tac
                     self._theme_basecodes[ti].append(tac)
                 else: # line defines aggregate values (parse out multiple values before comment)
-                    _tacs = [_tac.lower() for _tac in re.split('\s+', l.strip().partition(';')[0].strip())]
+                    _tacs = [sys.intern(_tac.lower()) for _tac in l.partition(';')[0].split()]
                     self._themes[ti][tac].extend(_tacs)
         #self.nthemes = len(self._themes)
 
@@ -1869,21 +2274,24 @@ class ForestModel:
         n = self.nthemes()
         model_path = self.model_path if not model_path else model_path
         model_name = self.model_name if not model_name else model_name
-        with open('%s/%s.%s' % (model_path, model_name, filename_suffix)) as f:
-            for l in f:
-                try:
-                    if re.match('^\s*(;|$)', l): continue # skip comments and blank lines
-                    l = l.lower().strip().partition(';')[0] # strip leading whitespace and trailing comments
-                    t = re.split('\s+', l)
-                    key = tuple(_t for _t in t[1:n+1])
-                    age = int(t[n+1])
-                    area = float(t[n+2].replace(',', ''))
-                    if area < self.area_epsilon and not import_empty: continue
-                    if key not in self.dtypes: self.dtypes[key] = DevelopmentType(key, self)
-                    self.dtypes[key].area(0, age, area)
-                except Exception as e:
-                    print('Failed AREAS import on line: \n%s' % l)
-                    return 1
+        records = []
+        for lnum, l in _read_section_lines('%s/%s.%s' % (model_path, model_name, filename_suffix)):
+            try:
+                t = l.lower().split()
+                key = tuple(map(sys.intern, t[1:n+1]))
+                age = int(t[n+1])
+                area = float(t[n+2].replace(',', ''))
+            except Exception as e:
+                print('Failed AREAS import on line: \n%s' % l)
+                return 1
+            if area < self.area_epsilon and not import_empty: continue
+            records.append((key, age, area))
+        # create missing dtypes in one pass (in order of first appearance), then assign areas
+        for key in dict.fromkeys(r[0] for r in records):
+            if key not in self.dtypes: self.dtypes[key] = DevelopmentType(key, self)
+        dtypes = self.dtypes
+        for key, age, area in records:
+            dtypes[key].area(0, age, area)
         return 0
 
                     
@@ -1897,37 +2305,99 @@ class ForestModel:
             print(c)
         return [c] if t[c] == c else list(_cfi(self._expand_theme(t, c) for c in t[c]))
 
+    def _theme_basecode_set(self, ti, c):
+        """
+        Returns (memoized) set of basecodes that theme code c expands to in theme ti.
+        """
+        key = (ti, c)
+        if key not in self._theme_expansions:
+            self._theme_expansions[key] = frozenset(self._expand_theme(self._themes[ti], c))
+        return self._theme_expansions[key]
+
+    def _mask_theme_order(self, mask):
+        """
+        Returns (memoized) tuple of (theme index, basecode set) pairs for non-wildcard themes in mask,
+        sorted by ascending basecode set size (i.e., most selective theme first).
+        Raises KeyError if mask contains a theme code that is not defined in the corresponding theme.
+        """
+        if mask not in self._mask_orders:
+            order = [(ti, self._theme_basecode_set(ti, tac)) for ti, tac in enumerate(mask) if tac != '?']
+            order.sort(key=lambda x: len(x[1]))
+            self._mask_orders[mask] = tuple(order)
+        return self._mask_orders[mask]
                 
     def match_mask(self, mask, key):
         """
         Returns True if key matches mask.
         """
-        #dt = self.dtypes[key]
-        for ti, tac in enumerate(mask):
-            if tac == '?': continue # wildcard matches all keys
-            tacs = self._expand_theme(self._themes[ti], tac)
+        for ti, tacs in self._mask_theme_order(mask):
             if key[ti] not in tacs: return False # reject key
         return True # key matches
         
+    @property
+    def dtypes(self):
+        """
+        Development types (dict keyed on development type key). Mutations are tracked (see ``_DtypeDict``), 
+        so assigning a plain dict wraps it.
+        """
+        return self._dtypes
+
+    @dtypes.setter
+    def dtypes(self, dtypes):
+        self._dtypes = _DtypeDict(dtypes)
+        self._theme_index_layout = None # (rebuild theme index, see _update_theme_index)
+        self._unmask_version = None
+
+    def _update_theme_index(self):
+        """
+        Adds development types created since last call to the (theme index, theme code) -> dtype keys index
+        (rebuilds the index if development types were removed or replaced since).
+        """
+        if self._theme_index_layout != self.dtypes.layout:
+            self._keys_by_theme.clear()
+            self._dtype_pos.clear()
+            self._theme_index_layout = self.dtypes.layout
+        n = len(self._dtype_pos)
+        if n == len(self.dtypes): return
+        for i, key in enumerate(itertools.islice(self.dtypes, n, None), start=n):
+            self._dtype_pos[key] = i
+            for ti, c in enumerate(key): self._keys_by_theme[ti][c].add(key)
+        
     def unmask(self, mask, verbose=0):
         """
         Iteratively filter list of development type keys using mask values.
         Accepts Woodstock-style string masks to facilitate cut-and-paste testing.
         """
         if isinstance(mask, str): # Woodstock-style string mask format
-            mask = tuple(re.sub('\s+', ' ', mask).lower().split(' '))
+            mask = tuple(mask.lower().split())
             assert len(mask) == self.nthemes() # must be bad mask if wrong theme count
         else:
             try:
                 assert isinstance(mask, tuple) and len(mask) == self.nthemes()
-            except:
+            except Exception:
                 print(len(mask), type(mask), mask)
                 assert False
-        dtype_keys = copy.copy(list(self.dtypes.keys())) # filter this
-        for ti, tac in enumerate(mask):
-            if tac == '?': continue # wildcard matches all
-            tacs = self._expand_theme(self._themes[ti], tac, verbose=verbose) if tac in self._themes[ti] else []
-            dtype_keys = [dtk for dtk in dtype_keys if dtk[ti] in tacs] # exclude bad matches
+        if self._unmask_version != self.dtypes.version: # development types changed since cached
+            self._unmask_cache.clear()
+            self._unmask_version = self.dtypes.version
+        cache_key = mask
+        if cache_key in self._unmask_cache:
+            return list(self._unmask_cache[cache_key])
+        self._update_theme_index()
+        if any(tac != '?' and tac not in self._themes[ti] for ti, tac in enumerate(mask)):
+            self._unmask_cache[cache_key] = () # undefined theme code matches nothing
+            return []
+        result = None
+        for ti, tacs in self._mask_theme_order(mask):
+            index = self._keys_by_theme[ti]
+            matches = set().union(*[index[c] for c in tacs if c in index])
+            result = matches if result is None else result & matches # exclude bad matches
+            if not result: break
+        if result is None:
+            dtype_keys = list(self.dtypes.keys())
+        else: # same order as self.dtypes
+            dtype_keys = sorted(result, key=self._dtype_pos.__getitem__)
+        self._unmask_cache[cache_key] = tuple(dtype_keys)
         return dtype_keys
 
     #@timed                            
@@ -1941,12 +2411,9 @@ class ForestModel:
             - Constants are stored in a dictionary where the keys are the constant names and the values are their respective values.
             - The section should contain information about various constants used in the model.
         """
-        with open('%s/%s.%s' % (self.model_path, self.model_name, filename_suffix)) as f:
-            for lnum, l in enumerate(f):
-                if re.match('^\s*(;|$)', l): continue # skip comments and blank lines
-                l = l.strip().partition(';')[0].strip() # strip leading whitespace, trailing comments
-                t = re.split('\s+', l)
-                self.constants[t[0].lower()] = float(t[1])
+        for lnum, l in _read_section_lines('%s/%s.%s' % (self.model_path, self.model_name, filename_suffix)):
+            t = l.split()
+            self.constants[t[0].lower()] = float(t[1])
 
     #@timed        
     def import_yields_section(self, filename_suffix='yld', mask_func=None, verbose=False):
@@ -1982,61 +2449,58 @@ class ForestModel:
         mask = ('?',) * self.nthemes()
         ynames = []
         data = None
-        with open('%s/%s.%s' % (self.model_path, self.model_name, filename_suffix)) as f:
-            for lnum, l in enumerate(f):
-                if re.match('^\s*(;|$)', l): continue # skip comments and blank lines
-                l = l.strip().partition(';')[0].strip() # strip leading whitespace and trailing comments
-                t = re.split('\s+', l)
-                if t[0].startswith('*Y'): # new yield definition
-                    newyield = True
-                    flush_ycomps(ytype, mask, ynames, data) # apply yield from previous block
-                    ytype = self._ytypes[t[0]]
-                    mask = tuple(_t.lower() for _t in t[1:])
-                    mask = mask_func(mask) if mask_func else mask
-                    if verbose: print(lnum, ' '.join(mask))
+        for lnum, l in _read_section_lines('%s/%s.%s' % (self.model_path, self.model_name, filename_suffix)):
+            t = l.split()
+            if t[0].startswith('*Y'): # new yield definition
+                newyield = True
+                flush_ycomps(ytype, mask, ynames, data) # apply yield from previous block
+                ytype = self._ytypes[t[0]]
+                mask = tuple(_t.lower() for _t in t[1:])
+                mask = mask_func(mask) if mask_func else mask
+                if verbose: print(lnum, ' '.join(mask))
+                continue
+            if newyield:
+                if t[0] == '_AGE':
+                    is_tabular = True
+                    ynames = [_t.lower() for _t in t[1:]]
+                    data = {yname:[] for yname in ynames}
+                    newyield = False
                     continue
-                if newyield:
-                    if t[0] == '_AGE':
-                        is_tabular = True
-                        ynames = [_t.lower() for _t in t[1:]]
-                        data = {yname:[] for yname in ynames}
-                        newyield = False
-                        continue
-                    else:
-                        is_tabular = False
-                        ynames = []
-                        data = {}
-                        newyield = False
-                else:
-                    if t[0] == '_AGE': # same yield block, new table
-                        flush_ycomps(ytype, mask, ynames, data) # apply yield from previous block
-                        is_tabular = True
-                        ynames = [_t.lower() for _t in t[1:]]
-                        data = {yname:[] for yname in ynames}
-                        newyield = False
-                        continue
-                if is_tabular:
-                    try:
-                        x = int(t[0])
-                    except:
-                        print(lnum, l)
-                    for i, yname in enumerate(ynames):
-                        data[yname].append((x, float(t[i+1])))
                 else:
-                    if ytype in 'at': # standard or time-based yield (extract xy values)
-                        if not common.is_num(t[0]): # first line of row-based yield component
-                            yname = t[0].lower()
-                            ynames.append(yname)
-                            data[yname] = [((int(t[1])*self.period_length)+(i*self.period_length),
-                                             float(t[i+2])) 
-                                           for i in range(len(t)-2)]
-                        else: # continuation of row-based yield compontent
-                            x_last = data[yname][-1][0]
-                            data[yname].extend([(i+x_last+1, float(t[i])) for i in range(len(t))])
-                    else:
+                    is_tabular = False
+                    ynames = []
+                    data = {}
+                    newyield = False
+            else:
+                if t[0] == '_AGE': # same yield block, new table
+                    flush_ycomps(ytype, mask, ynames, data) # apply yield from previous block
+                    is_tabular = True
+                    ynames = [_t.lower() for _t in t[1:]]
+                    data = {yname:[] for yname in ynames}
+                    newyield = False
+                    continue
+            if is_tabular:
+                try:
+                    x = int(t[0])
+                except ValueError:
+                    print(lnum, l)
+                for i, yname in enumerate(ynames):
+                    data[yname].append((x, float(t[i+1])))
+            else:
+                if ytype in 'at': # standard or time-based yield (extract xy values)
+                    if not common.is_num(t[0]): # first line of row-based yield component
                         yname = t[0].lower()
                         ynames.append(yname)
-                        data[yname] = ' '.join(t[1:]) # complex yield (defer interpretation)
+                        data[yname] = [((int(t[1])*self.period_length)+(i*self.period_length),
+                                         float(t[i+2])) 
+                                       for i in range(len(t)-2)]
+                    else: # continuation of row-based yield compontent
+                        x_last = data[yname][-1][0]
+                        data[yname].extend([(i+x_last+1, float(t[i])) for i in range(len(t))])
+                else:
+                    yname = t[0].lower()
+                    ynames.append(yname)
+                    data[yname] = ' '.join(t[1:]) # complex yield (defer interpretation)
         flush_ycomps(ytype, mask, ynames, data)
 
                     
@@ -2061,11 +2525,11 @@ class ForestModel:
         partials = {}
         keyword = ''
         with open('%s/%s.%s' % (self.model_path, self.model_name, filename_suffix)) as f: s = f.read().lower()
-        s = re.sub(r'\{.*?\}', '', s, flags=re.M|re.S) # remove curly-bracket comments
-        for l in re.split(r'[\r\n]+', s, flags=re.M|re.S):
-            if re.match('^\s*(;|$)', l): continue # skip comments and blank lines
+        s = _RE_CURLY.sub('', s) # remove curly-bracket comments
+        for l in _RE_NEWLINE.split(s):
+            if _is_comment(l): continue # skip comments and blank lines
             l = l.strip().partition(';')[0].strip() # strip leading whitespace and trailing comments
-            l = re.sub('\s+', ' ', l) # separate tokens by single space
+            l = ' '.join(l.split()) # separate tokens by single space
             tokens = l.split(' ')
             if l.startswith('*action'): 
                 keyword = 'action'
@@ -2097,14 +2561,17 @@ class ForestModel:
                     self.actions[acode].partial.extend(tokens)
         for acode, a in list(self.actions.items()):
             if a.components: continue # aggregate action, skip
+            expressions = dd(list)
             for mask, expression in list(self.oper_expr[acode].items()):
                 for k in self.unmask(mask):
                     #if acode == 'act1': print ' '.join(k), acode, expression
-                    self.dtypes[k].oper_expr[acode].append(expression)
+                    expressions[k].append(expression)
+            for k, e in expressions.items(): # compile right away (see DevelopmentType.set_oper_expr)
+                self.dtypes[k].set_oper_expr(acode, self.dtypes[k].oper_expr.get(acode, []) + e)
 
     def resolve_treplace(self, dt, treplace):
         if '_TH' in treplace: # assume incrementing integer theme value
-            i = int(re.search('(?<=_TH)\w+', treplace).group(0))
+            i = int(re.search(r'(?<=_TH)\w+', treplace).group(0))
             return eval(re.sub('_TH%i'%i, str(dt.key[i-1]), treplace))
         else:
             assert False # many other possible arguments (see Forest documentation)
@@ -2132,18 +2599,15 @@ class ForestModel:
     def resolve_condition(self, condition, dtype_key=None):
         """
         Evaluate @AGE or @YLD condition.
-        Returns list of ages.
+        Returns sequence of ages.
         """
         if not condition:
             #return self.ages
             return [-1]
         elif condition.startswith('@AGE'):
-            lo, hi = [int(a) for a in condition[5:-1].split('..')]
-            return list(range(lo, hi+1))
+            return _parse_age_condition(condition) # shared (immutable) range object
         elif condition.startswith('@YLD'):
-            args = re.split('\s?,\s?', condition[5:-1])
-            yname = args[0].lower()
-            lo, hi = [float(y) for y in args[1].split('..')]
+            yname, lo, hi = _parse_yld_condition(condition)
             dt = self.dtypes[dtype_key]
             lo_age, hi_age = dt.ycomp(yname).range(lo, hi, as_bounds=True)
             return list(range(lo_age, hi_age+1))
@@ -2158,16 +2622,10 @@ class ForestModel:
         # local utility function ####################################
         def flush_transitions(acode, sources):
             if not acode: return # nothing to flush on first loop
-            self.transitions[acode] = {}
+            transitions = self.transitions[acode] = {}
             for smask, scond in sources:
-                #if acode in ['acp']:
-                #    print [' '.join(smask)], scond, sources[smask, scond]
                 # store transition data for future dtypes creation 
-                if smask not in self.transitions[acode]:
-                    self.transitions[acode][smask] = {}
-                #if scond not in self.transitions[acode][smask]:
-                #    self.transitions[acode][smask][scond] = []
-                self.transitions[acode][smask][scond] = sources[smask, scond]
+                transitions.setdefault(smask, {})[scond] = sources[smask, scond]
                 # assign transitions to existing dtypes
                 for k in self.unmask(smask):
                     dt = self.dtypes[k]
@@ -2184,48 +2642,34 @@ class ForestModel:
         acode = None
         with open('%s/%s.%s' % (self.model_path, self.model_name, filename_suffix)) as f:
             s = f.read()
-        s = re.sub(r'\{.*?\}', '', s, flags=re.M|re.S) # remove curly-bracket comments
-        for l in re.split(r'[\r\n]+', s, flags=re.M|re.S):
-            if re.match('^\s*(;|$)', l): continue # skip comments and blank lines
+        s = _RE_CURLY.sub('', s) # remove curly-bracket comments
+        for l in _RE_NEWLINE.split(s):
+            if _is_comment(l): continue # skip comments and blank lines
             l = l.strip().partition(';')[0].strip() # strip leading whitespace, trailing comments
-            tokens = re.split('\s+', l)
+            tokens = l.split()
             if l.startswith('*CASE'):
                 if acode: flush_transitions(acode, sources)
                 acode = tokens[1].lower()
                 sources = {}
             elif l.startswith('*SOURCE'):
-                smask = tuple(t.lower() for t in tokens[1:nthemes+1])
+                smask = tuple(map(sys.intern, l.lower().split(None, nthemes+1)[1:nthemes+1]))
                 smask = mask_func(smask) if mask_func else smask
-                match = re.search(r'@.+\)', l)
+                match = _RE_AT.search(l)
                 scond = match.group(0) if match else ''
                 sources[(smask, scond)] = []
             elif l.startswith('*TARGET'):
-                tmask = tuple(t.lower() for t in tokens[1:nthemes+1])
+                ltokens = l.lower().split() # lowercase line once (keywords below are matched on original tokens)
+                tmask = tuple(map(sys.intern, ltokens[1:nthemes+1]))
                 tmask = mask_func(tmask) if mask_func else tmask
                 tprop = float(tokens[nthemes+1]) * 0.01
                 tyield = None
-                if len(tokens) > nthemes+2 and tokens[nthemes+2].lower() in self.ynames:
-                    tyield = (tokens[nthemes+2].lower(), float(tokens[nthemes+3]))
-                try: # _AGE keyword
-                    tage = int(tokens[tokens.index('_AGE')+1])
-                except:
-                    tage = None
-                try: # _LOCK keyword
-                    tlock = int(tokens[tokens.index('_LOCK')+1])
-                except:
-                    tlock = None
-                try: # _REPLACE keyword (TO DO: implement other cases)
-                    args = re.split('\s?,\s?', re.search('(?<=_REPLACE\().*(?=\))', l).group(0))
-                    theme_index = int(args[0][3]) - 1
-                    treplace = theme_index, args[1]
-                except:
-                    treplace = None
-                try: # _APPEND keyword (TO DO: implement other cases)
-                    args = re.split('\s?,\s?', re.search('(?<=_APPEND\().*(?=\))', l).group(0))
-                    theme_index = int(args[0][3]) - 1
-                    tappend = theme_index, args[1]
-                except:
-                    tappend = None
+                if len(tokens) > nthemes+2 and ltokens[nthemes+2] in self.ynames:
+                    tyield = (ltokens[nthemes+2], float(tokens[nthemes+3]))
+                # optional keywords (test for presence, rather than catching exceptions on every line)
+                tage = _keyword_int(tokens, '_AGE')
+                tlock = _keyword_int(tokens, '_LOCK')
+                treplace = _keyword_theme_arg(_RE_REPLACE, l) if '_REPLACE' in l else None # TO DO: implement other cases
+                tappend = _keyword_theme_arg(_RE_APPEND, l) if '_APPEND' in l else None # TO DO: implement other cases
                 sources[(smask, scond)].append((tmask, tprop, tyield, tage, tlock, treplace, tappend))
         flush_transitions(acode, sources)
 
@@ -2269,9 +2713,9 @@ class ForestModel:
         n = self.nthemes()
         with open('%s/%s.%s' % (self.model_path, filename_prefix, filename_suffix)) as f:
             for lnum, l in enumerate(f):
-                if re.match('^\s*(;|$)', l): continue # skip comments and blank lines
+                if _is_comment(l): continue # skip comments and blank lines
                 l = l.lower().strip().partition(';')[0].strip() # strip leading whitespace and trailing comments
-                t = re.split('\s+', l)
+                t = l.split()
                 if len(t) != n + 5: break
                 dtype_key = tuple(t[:n])
                 age = int(t[n])
@@ -2300,12 +2744,11 @@ class ForestModel:
         result = []
         for period in self.periods:
             aa = self.applied_actions[period]
-            for acode in aa.keys():
-                for dtk in aa[acode].keys():
+            for acode, _aa in aa.items():
+                for dtk, ages in _aa.items():
                     etype = '_existing' if self.dt(dtk).area(0) else '_future'
-                    for age in aa[acode][dtk].keys():
-                        area = aa[acode][dtk][age][0]
-                        result.append((dtk, age, area, acode, period, etype))
+                    for age, aaa in ages.items():
+                        result.append((dtk, age, aaa[0], acode, period, etype))
         return result
            
     
@@ -2396,7 +2839,11 @@ class ForestModel:
         """
         Simulates growth (default startint at period 1 and cascading to the end of the planning horizon).
         """
-        for dt in list(self.dtypes.values()): dt.grow(start_period, cascade)
+        end_period = start_period + 1 if not cascade else self.horizon
+        if common.HAVE_NUMBA:
+            _grow_kernel(self._areas(), start_period, end_period, self.period_length) # all development types at once
+        else:
+            _grow_areas(self._areas(), start_period, end_period, self.period_length) # all development types at once
     
     def _cbm_sit_classifiers(self):
         """
@@ -2500,8 +2947,9 @@ class ForestModel:
         data = {**{c:[] for c in theme_cols}, **{c:[] for c in ['age', 'area']}}
         for dtype_key in self.dtypes:
             dt = self.dtypes[dtype_key]
-            if not dt._areas[0]: continue # developement type not in initial inventory
-            for age, area in dt._areas[0].items():
+            if not dt._areas[0].any(): continue # developement type not in initial inventory
+            for age in np.flatnonzero(dt._areas[0]).tolist():
+                area = dt._areas[0, age]
                 for i, c in enumerate(theme_cols): data[c].append(dtype_key[i])
                 data['age'].append(age)
                 data['area'].append(area)
@@ -2634,7 +3082,7 @@ class ForestModel:
         def resolve_target(dtype_key, target, sage):
             tmask, tprop, tyield, tage, tlock, treplace, tappend = target # unpack tuple
             dtk = list(dtype_key) # start with source key
-            dtk = [t if tmask[i] == '?' else tmask[i] for i, t in enumerate(dtk)] 
+            for i, v in _mask_fixed(tmask): dtk[i] = v
             if treplace: dtk[treplace[0]] = self.resolve_replace(dtk, treplace[1])
             if tappend: dtk[tappend[0]] = self.resolve_append(dtk, tappend[1])
             dtk = tuple(dtk)
@@ -25,10 +25,14 @@
 import pandas as pd
 import numpy as np
 import rasterio
+from rasterio.windows import Window
 import os
 from profilehooks import profile
 import random
-import copy
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from ws3 import common
 
 """
 This module implements the ``ForestRaster`` class, which can be used to allocate an 
@@ -38,11 +42,89 @@ representation of the forest inventory.
 """
 
 
+@common.njit(cache=True, boundscheck=False)
+def _scatter_cells(x0, x1, ids, th, to_age):
+    """
+    Compiled single-pass version of the theme hash and age layer writes for transitioned pixels
+    (flat views of layers, flat pixel indices).
+    """
+    for k in range(ids.size):
+        i = ids[k]
+        x0[i] = th
+        x1[i] = to_age
+
+
+@common.njit(cache=True, boundscheck=False)
+def _select_blocks(pos, bounds, order, is_candidate, ncand, n, nmax, allow_split):
+    """
+    Compiled version of the randblk block selection loop. Pops block positions off the end of ``pos``
+    (pixels of block ``b`` are ``order[bounds[b]:bounds[b+1]]``), collecting candidate pixels of each
+    block until ``n`` pixels are selected. Blocks that would overshoot ``nmax`` are skipped (the last
+    block is split if ``allow_split``). Returns selected flat pixel indices (at most ``ncand``, the
+    number of candidate pixels).
+    """
+    out = np.empty(ncand, dtype=order.dtype)
+    _n, k = 0, pos.size
+    while _n < n and k > 0:
+        k -= 1
+        b = pos[k]
+        m = 0
+        for i in range(bounds[b], bounds[b + 1]):
+            j = order[i]
+            if is_candidate[j]:
+                out[_n + m] = j
+                m += 1
+        if _n + m > nmax:
+            if k > 0: # look for smaller block
+                continue
+            elif allow_split:
+                m = n - _n
+        _n += m
+    return out[:_n]
+
+
+@common.njit(cache=True)
+def _partial_shuffle(perm, u):
+    """
+    Partial Fisher-Yates shuffle of the first ``u.size`` positions of ``perm`` (driven by
+    uniform variates ``u``). Returns sampled values, and restores ``perm`` to its original order.
+    """
+    n, xn = u.size, perm.size
+    js = np.empty(n, dtype=np.int64)
+    for k in range(n):
+        j = min(k + int(u[k] * (xn - k)), xn - 1)
+        js[k] = j
+        perm[k], perm[j] = perm[j], perm[k]
+    result = perm[:n].copy()
+    for k in range(n - 1, -1, -1): # undo swaps (scratch array stays reusable)
+        j = js[k]
+        perm[k], perm[j] = perm[j], perm[k]
+    return result
+
+
+def _write_pool_threads(n_files, reserved=0):
+    """
+    Returns (max_workers, num_threads) for writing ``n_files`` GeoTIFF files concurrently: one thread pool 
+    worker per file (up to the CPU count, less ``reserved`` CPUs), and GDAL encoding threads per file 
+    splitting the remaining CPUs (so ``max_workers * num_threads`` never exceeds the CPU count).
+    """
+    ncpu = max((os.cpu_count() or 1) - reserved, 1)
+    max_workers = max(min(n_files, ncpu), 1)
+    return max_workers, max(ncpu // max_workers, 1)
+
+
 class ForestRaster:
     """
     The ``ForestRaster`` class can be used to allocate an aspatial disturbance schedule 
     (for example, an optimal solution to a wood supply problem generated by an instance 
     of the ``forest.ForestModel`` class) to a rasterized representation of the forest inventory. 
+
+    .. note::
+       Output GeoTIFF files are tiled (256x256) and ZSTD-compressed by default (earlier versions wrote
+       LZW-compressed files). GDAL builds without ZSTD support (GDAL < 2.3, or
+       built without libzstd) cannot read them, so pass ``tif_compress='lzw'`` to get files that any
+       GeoTIFF reader can open. Packing ``uint8`` disturbance layers to 1 bit per pixel makes files
+       smaller, but is opt-in (pass ``tif_options={'nbits': 1}``), since some readers do not support it.
     """
     def __init__(self,
                  hdt_map,
@@ -54,11 +136,13 @@ class ForestRaster:
                  base_year,
                  horizon=None,
                  period_length=10,
-                 tif_compress='lzw',
+                 tif_compress='zstd',
                  tif_dtype=rasterio.uint8,
                  piggyback_acodes=None,
                  time_step=1,
-                 disturb_thresh=10):
+                 disturb_thresh=10,
+                 seed=None,
+                 tif_options=None):
         """
 
         :param dict hdt_map: A dictionary mapping hash values to development types.
@@ -92,8 +176,9 @@ class ForestRaster:
           periods). If ``None``, defaults to ``forestmodel.horizon``.
         :param int base_year: Base year for numbering of annual time steps (affects 
           GeoTIFF output filenames).
-        :param str tiff_compress: GeoTIFF output file compression mode (uses LZW lossless 
-          compression by default).
+        :param str tiff_compress: GeoTIFF output file compression mode (uses ZSTD lossless 
+          compression by default, which encodes several times faster than LZW at a comparable ratio;
+          pass ``'lzw'`` if output files must be readable by GDAL builds without ZSTD support, see note above).
         :param rasterio.dtype tif_dtype: Data type for output GeoTIFF files (defaults to 
           ``rasterio.uint8``, i.e., an 8-byte unsigned integer).
         :param dict(str, list) piggyback_acodes: A dictionary of list of tuples, describing 
@@ -107,9 +192,18 @@ class ForestRaster:
         disturbance, we would pass a value of  
         ``{'clearcut':[('slashburn', 0.85)]}`` for the ``piggyback_acodes``
         parameter. 
+
+        :param int seed: Seed for the random number generator used to select pixels. If ``None``
+          (default), the generator is seeded from the legacy global NumPy random state 
+          (so results are still reproducible after calling ``np.random.seed``). Pixel selections for a given 
+          seed differ from earlier versions (pixels are drawn from a PCG64 generator, with fewer draws per 
+          period and per piggybacked action), so seeded outputs are only reproducible within a version.
+        :param dict tif_options: Extra GeoTIFF creation options for output disturbance files
+          (e.g., ``{'blockxsize':512, 'blockysize':512}``, or ``{'nbits':1}`` to pack ``uint8`` disturbance 
+          layers to 1 bit per pixel), applied on top of the defaults.
         """
         self._hdt_map = hdt_map
-        self._hdt_func = hdt_func
+        self._hdt_func = functools.lru_cache(maxsize=None)(hdt_func) # pure function of dtype key, so memoize
         self._acodes = list(acode_map.keys())
         self._acode_map = acode_map
         self._forestmodel = forestmodel
@@ -120,24 +214,50 @@ class ForestRaster:
         self._i2a = {i: a for i, a in enumerate(self._acodes)}
         self._a2i = {a: i for i, a in enumerate(self._acodes)}
         self._p = 1 # initialize current period
-        self._src = rasterio.open(src_path, 'r')
+        self._rng = np.random.default_rng(np.random.randint(2**32, dtype=np.uint64) if seed is None else seed)
+        self._src = rasterio.open(src_path, 'r', sharing=False)
+        self._src_profile = self._src.profile # (dataset profile property is rebuilt on every access)
+        self._nodata = int(self._src_profile['nodata'])
+        # whole inventory stays in memory (transitions touch arbitrary pixels, and every period writes 
+        # a complete inventory snapshot), read once into a single array
         self._x = self._src.read()
-        self._ix_forested = np.where(self._x[0] != 0)
-        self._blkid = np.unique(self._x[2])
+        # flat (no copy) views of theme hash, age and block layers, indexed with flat pixel indices
+        self._x0f, self._x1f, self._x2f = self._x[0].ravel(), self._x[1].ravel(), self._x[2].ravel()
+        self._idx_dtype = np.int32 if self._x0f.size < 2**31 else np.int64
+        self._ix_forested = np.flatnonzero(self._x0f != 0).astype(self._idx_dtype)
+        self._init_cell_index()
+        self._init_block_index()
+        self._perm_scratch = np.arange(0, dtype=np.int64)
+        self._mask_scratch = np.zeros(self._x0f.size, dtype=bool) # candidate pixel membership (all False between calls)
+        self._move_scratch = np.zeros(self._x0f.size, dtype=bool) # moved pixel membership (all False between calls)
+        self._blkid = np.fromiter(self._block_pixels.keys(), dtype=self._x[2].dtype) # sorted (see _init_block_index)
         self._d = self._src.transform.a # pixel width
         self._pixel_area = pow(self._d, 2) * 0.0001 # m to hectares
-        profile = copy.copy(self._src.profile)
-        profile.update(dtype=tif_dtype, compress=tif_compress, count=1, nodata=0)
+        profile = dict(self._src_profile) # (plain dict, sink files are opened with **profile)
+        profile.update(dtype=tif_dtype, compress=tif_compress, count=1, nodata=0,
+                       tiled=True, blockxsize=256, blockysize=256) # tiled, so only dirty blocks get written
+        if tif_compress and tif_compress.lower() in ('zstd', 'deflate', 'lzw'):
+            profile.update(predictor=2)
+        if tif_compress and tif_compress.lower() == 'zstd': profile.update(zstd_level=1)
+        if tif_compress and tif_compress.lower() == 'deflate': profile.update(zlevel=1)
+        if tif_options: profile.update(tif_options)
+        if profile.get('nbits') is not None and int(profile['nbits']) < 8: profile.pop('predictor', None) # (predictor needs >= 8 bits)
         self._piggyback_acodes = piggyback_acodes
         self._snk_path = snk_path
         self._tif_dtype = tif_dtype
         self._tif_compress = tif_compress
-        self._snk = {(p, dy):{acode:rasterio.open(snk_path+'/%s_%i.tif' % (acode_map[acode], base_year+(p-1)*period_length + dy), 'w+', **profile)
+        self._snk_profile = profile
+        # output GeoTIFF file paths (files are only opened when a period is written, so at most 
+        # one period worth of file handles is ever open at once)
+        self._snk = {(p, dy):{acode:snk_path+'/%s_%i.tif' % (acode_map[acode], base_year+(p-1)*period_length + dy)
             for acode in self._acodes}
             for dy in range(0, period_length, self._time_step) for p in range(1, (horizon+1))}
+        self._snk_pending = set(self._snk) # (p, dy) keys of sink files not written yet
         self._init_snkd()
         self._is_valid = True
         self._disturb_thresh = disturb_thresh
+        self._trn_cache = {} # (dtk, acode, from_age) -> (to_dtk, to_age, th), see _resolve_transition
+        self._blk_heat = None # block means of smoothed recent disturbance layer (for aggregate_disturbance)
         
     def commit(self):
         """
@@ -147,9 +267,11 @@ class ForestRaster:
         calls to :py:meth:`.allocate_schedule` will trigger a 
         :py:exc:`~exceptions.RuntimeError` exception.
         """
-        for p in self._snk:
-            for acode in self._snk[p]:
-                self._snk[p][acode].close()
+        paths = [self._snk[(p, dy)][acode] for p, dy in sorted(self._snk_pending) for acode in self._acodes]
+        max_workers, num_threads = _write_pool_threads(len(paths))
+        with ThreadPoolExecutor(max_workers) as executor: # create (empty) output files for periods not allocated
+            list(executor.map(lambda path: self._write_snk_layer(path, (), num_threads), paths))
+        self._snk_pending.clear()
         self._is_valid = False
 
     def cleanup(self):
@@ -227,76 +349,106 @@ class ForestRaster:
         :param float fudge: *[FOR DEBUG USE ONLY. DO NOT MODIFY.]* 
         """
         if not self._is_valid: raise RuntimeError('commit() already called (i.e., instance is toast).')
-        if mask: dtype_keys = self._forestmodel.unmask(mask)
+        if mask: dtype_keys = frozenset(self._forestmodel.unmask(mask))
+        DY = list(range(0, self._period_length, self._time_step))
+        _tr = self._period_length / self._time_step # target ratio
+        # flatten (dtk, from_age) cases with non-zero area (in schedule order), and resolve
+        # transition targets of all cases in one pass before allocating anything
+        schedule = {p:[(acode, [(dtk, from_age, v[0]) + self._resolve_transition(dtk, acode, from_age)
+                                for dtk, _aa in aa.items() if not mask or dtk in dtype_keys
+                                for from_age, v in _aa.items() if v[0]])
+                       for acode, aa in self._forestmodel.applied_actions[p].items()]
+                    for p in range(1, self._horizon+1)}
         for p in range(1, self._horizon+1):
             if verbose > 0: print('processing schedule for period %i' % p)
-            for acode in self._forestmodel.applied_actions[p]:
-                for dtk in self._forestmodel.applied_actions[p][acode]:
-                    #print('dtk', dtk)
-                    if mask:
-                        if dtk not in dtype_keys: continue
-                    for from_age in self._forestmodel.applied_actions[p][acode][dtk]:
-                        area = self._forestmodel.applied_actions[p][acode][dtk][from_age][0]
-                        print('processing case', p, acode, dtk, from_age, area) # DEBUG
-                        if not area: continue
-                        from_dtk = list(dtk) 
-                        trn = self._forestmodel.dtypes[dtk].transitions[acode, from_age][0]
-                        tmask, tprop, tyield, tage, tlock, treplace, tappend = trn
-                        to_dtk = [t if tmask[i] == '?' else tmask[i] for i, t in enumerate(from_dtk)] 
-                        if treplace: to_dtk[treplace[0]] = self._forestmodel.resolve_replace(from_dtk, treplace[1])
-                        to_dtk = tuple(to_dtk)
-                        to_age = self._forestmodel.resolve_targetage(to_dtk, tyield, from_age, tage, acode, verbose=False)
-                        to_age = max(to_age, minage) # hack! (yuck)
-                        tk = tuple(to_dtk)+(to_age,)
-                        _target_area = area
-                        DY = list(range(0, self._period_length, self._time_step))
-                        #random.shuffle(DY)
-                        for dy in DY:
-                            print('dy', dy)
-                            _tr = self._period_length / self._time_step # target ratio
-                            if area < (_tr * self._pixel_area): # less than one pixel per year
-                                if _target_area > self._pixel_area * 0.5:
-                                    target_area = self._pixel_area
-                                    _target_area -= self._pixel_area
-                                else:
-                                    break
+            for acode, cases in schedule[p]:
+                for dtk, from_age, area, to_dtk, to_age, th in cases:
+                    if verbose > 1: print('processing case', p, acode, dtk, from_age, area)
+                    from_dtk = list(dtk) 
+                    to_age = max(to_age, minage) # hack! (yuck)
+                    _target_area = area
+                    from_key = (int(self._hdt_func(dtk)), int(from_age - da))
+                    targets = [] # (dy, target_area) pairs
+                    for dy in DY:
+                        if area < (_tr * self._pixel_area): # less than one pixel per year
+                            if _target_area > self._pixel_area * 0.5:
+                                targets.append((dy, self._pixel_area))
+                                _target_area -= self._pixel_area
                             else:
-                                target_area = area / _tr
-                            from_ages = [from_age]
-                            while from_ages and target_area:
-                                from_age = from_ages.pop()
-                                target_area = self._transition_cells(from_dtk, from_age,
-                                                                     to_dtk, to_age,
-                                                                     target_area, acode, dy,
-                                                                     mode=sda_mode, da=da, fudge=fudge,
-                                                                     ovrflwthr=ovrflwthr,
-                                                                     verbose=verbose,
-                                                                     nthresh=nthresh,
-                                                                     aggregate_disturbance=aggregate_disturbance)
-                            if target_area and verbose > 0:
+                                break
+                        else:
+                            targets.append((dy, area / _tr))
+                    if sda_mode == 'randpxl' and from_key != (th, to_age):
+                        # draw pixels for all years of the period at once (transitioned pixels leave the 
+                        # candidate bucket, so this is equivalent to drawing year by year)
+                        missing = self._transition_cells_randpxl_batch(from_key, th, to_age, targets, acode)
+                        if verbose > 0:
+                            for dy, target_area in missing:
                                 print('failed', (from_dtk, from_age, to_dtk, to_age, acode), end=' ')
                                 print('(missing %4.1f of %4.1f)' % (target_area, area / _tr),
                                       'in p%i dy%i' % (p, dy))
+                        continue
+                    #random.shuffle(DY)
+                    for dy, target_area in targets:
+                        if from_key not in self._cells: break # candidate pixels exhausted (no later dy can succeed)
+                        if verbose > 1: print('dy', dy)
+                        from_ages = [from_age]
+                        while from_ages and target_area:
+                            from_age = from_ages.pop()
+                            target_area = self._transition_cells(from_dtk, from_age,
+                                                                 to_dtk, to_age,
+                                                                 target_area, acode, dy,
+                                                                 mode=sda_mode, da=da, fudge=fudge,
+                                                                 ovrflwthr=ovrflwthr,
+                                                                 verbose=verbose,
+                                                                 nthresh=nthresh,
+                                                                 aggregate_disturbance=aggregate_disturbance,
+                                                                 fh=from_key[0], th=th)
+                        if target_area and verbose > 0:
+                            print('failed', (from_dtk, from_age, to_dtk, to_age, acode), end=' ')
+                            print('(missing %4.1f of %4.1f)' % (target_area, area / _tr),
+                                  'in p%i dy%i' % (p, dy))
                 if acode in self._piggyback_acodes:
+                    disturbed = {dy:self._disturbed_cells(acode, dy) for dy in DY} # shared by all piggybacked acodes
+                    sizes = [len(disturbed[dy]) for dy in DY]
                     for _acode, _p in self._piggyback_acodes[acode]:
-                        for dy in range(0, self._period_length, self._time_step):
-                            x = np.where(self._snkd[(acode, dy)] == 1)
-                            xn = len(x[0])
-                            if not xn: continue # bug fix (is this OK?)
-                            r = np.random.choice(xn, int(_p * xn), replace=False)
-                            ix = x[0][r], x[1][r]
-                            self._snkd[(_acode, dy)][ix] = 1
-            self._write_snk()
+                        # one uniform draw covers all years; each year keeps the pixels with the smallest
+                        # variates (uniform random subset of exactly int(_p * xn) pixels)
+                        u = np.split(self._rng.random(sum(sizes)), np.cumsum(sizes)[:-1])
+                        for dy, _u in zip(DY, u):
+                            ids = disturbed[dy]
+                            xn, n = len(ids), int(_p * len(ids))
+                            if not n: continue # bug fix (is this OK?)
+                            r = np.argpartition(_u, n - 1)[:n] if n < xn else slice(None)
+                            self._snkd[(_acode, dy)].append(ids[r])
             year = self._base_year + ((p - 1) * self._period_length)
             snk_filename = self._snk_path+'/inventory_%i.tif' % year
-            with rasterio.open(snk_filename, 'w', **self._src.profile) as snk:
-                __x = np.copy(self._x)
-                if verbose > 0:
-                    print('saving %i post-harvest pixels to %s' % (year, snk_filename))
-                snk.write(__x) 
+            if verbose > 0:
+                print('saving %i post-harvest pixels to %s' % (year, snk_filename))
+            with ThreadPoolExecutor(max_workers=1) as executor: # write inventory snapshot while sink files are written
+                inventory = executor.submit(self._write_inventory, snk_filename)
+                self._write_snk(reserved=1) # (leave a CPU to the inventory writer thread)
+                inventory.result()
             if p < self._horizon: self.grow()
 
 
+    def _resolve_transition(self, dtk, acode, from_age):
+        """
+        Returns (to_dtk, to_age, th) tuple (target development type key, target age, and target hash value)
+        for the first transition of action acode applied to development type dtk at age from_age.
+        Memoized, as the same transitions recur in every period.
+        """
+        key = (dtk, acode, from_age)
+        if key in self._trn_cache: return self._trn_cache[key]
+        trn = self._forestmodel.dtypes[dtk].transitions[acode, from_age][0]
+        tmask, tprop, tyield, tage, tlock, treplace, tappend = trn
+        to_dtk = [t if tmask[i] == '?' else tmask[i] for i, t in enumerate(dtk)] 
+        if treplace: to_dtk[treplace[0]] = self._forestmodel.resolve_replace(dtk, treplace[1])
+        to_dtk = tuple(to_dtk)
+        to_age = self._forestmodel.resolve_targetage(to_dtk, tyield, from_age, tage, acode, verbose=False)
+        self._trn_cache[key] = to_dtk, to_age, int(self._hdt_func(to_dtk))
+        return self._trn_cache[key]
+
     def __enter__(self):
         # The value returned by this method is
         # assigned to the variable after ``as``
@@ -312,59 +464,168 @@ class ForestRaster:
     
     def _read_snk(self, acode, dy, verbose=False):
         if verbose: print('ForestRaster._read_snk()', self._p, acode)
-        return self._snk[(self._p, dy)][acode].read(1)
+        with rasterio.open(self._snk[(self._p, dy)][acode]) as snk:
+            return snk.read(1)
 
 
-    def _write_snk(self, write=True):
-        for dy in range(0, self._period_length, self._time_step):
-            for acode in self._acodes:
-                snk = self._snk[(self._p, dy)][acode]
-                if write: snk.write(self._snkd[(acode, dy)], indexes=1)
-                snk.close()
+    def _write_snk(self, write=True, reserved=0):
+        """
+        Creates and writes the sink GeoTIFF files of the current period.
+        Sink files are independent, so they are written concurrently (GDAL releases the GIL while
+        encoding and writing blocks), on all CPUs but ``reserved`` (see ``_write_pool_threads``).
+        """
+        DY = range(0, self._period_length, self._time_step)
+        layers = [(self._snk[(self._p, dy)][acode], self._disturbed_cells(acode, dy) if write else ())
+                  for dy in DY for acode in self._acodes]
+        max_workers, num_threads = _write_pool_threads(len(layers), reserved)
+        with ThreadPoolExecutor(max_workers) as executor:
+            list(executor.map(lambda layer: self._write_snk_layer(*layer, num_threads), layers))
+        self._snk_pending.difference_update((self._p, dy) for dy in DY)
 
+    def _write_inventory(self, path):
+        """
+        Writes snapshot of the inventory raster layers (theme hash, age, block) for current period
+        (single GDAL thread, as it runs concurrently with the sink file writer pool).
+        """
+        with rasterio.open(path, 'w', **{**self._src_profile, 'num_threads': 1}) as snk:
+            snk.write(self._x) # (not modified until grow, so no defensive copy needed)
+
+    def _write_snk_layer(self, path, ids, num_threads=1):
+        """
+        Creates sink GeoTIFF file and writes disturbed pixels (sorted flat indices), one window per dirty block
+        (blocks without disturbed pixels are never written, and read back as nodata).
+        Uses ``num_threads`` GDAL encoding threads (unless set in ``tif_options``).
+        """
+        with rasterio.open(path, 'w', **{'num_threads': num_threads, **self._snk_profile}) as snk:
+            if len(ids): self._write_snk_blocks(snk, ids)
+
+    def _write_snk_blocks(self, snk, ids):
+        height, width = self._x[0].shape
+        bh, bw = snk.block_shapes[0]
+        rows, cols = np.divmod(ids, width)
+        bkey = (rows // bh) * ((width + bw - 1) // bw) + cols // bw # block index (row-major)
+        order = np.argsort(bkey, kind='stable')
+        rows, cols, bkey = rows[order], cols[order], bkey[order]
+        starts = np.flatnonzero(np.r_[True, bkey[1:] != bkey[:-1]])
+        for i, j in zip(starts, np.r_[starts[1:], bkey.size]): # dirty blocks
+            r0, c0 = rows[i] // bh * bh, cols[i] // bw * bw
+            window = Window(c0, r0, min(bw, width - c0), min(bh, height - r0))
+            buf = np.zeros((window.height, window.width), dtype=self._tif_dtype)
+            buf.ravel()[(rows[i:j] - r0) * window.width + (cols[i:j] - c0)] = 1 # (flat index into block buffer)
+            snk.write(buf, indexes=1, window=window)
+
+
+    def _init_cell_index(self):
+        """
+        Builds inverted index of forested pixels, mapping (hash, age) tuples to sorted
+        arrays of flat pixel indices (same order as a row-major ``np.where`` scan of the raster).
+        """
+        ids = self._ix_forested
+        h, a = self._x0f[ids], self._x1f[ids]
+        # pack (hash, age) into a single uint64 sort key (hash in high 32 bits, age in low 32 bits)
+        key = (h.astype(np.uint32).astype(np.uint64) << np.uint64(32)) | a.astype(np.uint32).astype(np.uint64)
+        order = np.argsort(key, kind='stable') # stable, so ids stay sorted within each (hash, age) group
+        ids, h, a, key = ids[order], h[order], a[order], key[order]
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        ends = np.r_[starts[1:], ids.size]
+        self._cells = {(int(h[i]), int(a[i])): ids[i:j] for i, j in zip(starts, ends)}
+
+    def _init_block_index(self):
+        """
+        Builds index mapping block ID (from the static block layer) to sorted array of flat pixel indices.
+        """
+        blk = self._x2f
+        order = np.argsort(blk, kind='stable').astype(self._idx_dtype)
+        _blk = blk[order]
+        starts = np.flatnonzero(np.r_[True, _blk[1:] != _blk[:-1]]) # sorted, so no need for np.unique
+        blkid, ends = _blk[starts], np.r_[starts[1:], blk.size]
+        self._block_pixels = {b: order[i:j] for b, i, j in zip(blkid.tolist(), starts, ends)}
+        self._blk_order, self._blk_bounds = order, np.r_[starts, blk.size] # CSR form (for _select_blocks)
+        # block position (0..n_blocks-1, in sorted block ID order) of each pixel
+        self._blk_pos = np.empty(blk.size, dtype=np.int32)
+        self._blk_pos[order] = np.repeat(np.arange(starts.size, dtype=np.int32), ends - starts)
+
+    def _move_cells(self, ids, from_key, to_key):
+        """
+        Moves pixels (array of flat pixel indices) from one (hash, age) bucket
+        of the inverted pixel index to another.
+        """
+        if not ids.size: return
+        to_key = (int(to_key[0]), int(to_key[1]))
+        if from_key == to_key: return
+        is_moved = self._move_scratch
+        is_moved[ids] = True
+        bucket = self._cells[from_key]
+        bucket = bucket[~is_moved[bucket]] # single gather pass (no sort, unlike np.setdiff1d)
+        is_moved[ids] = False
+        if bucket.size:
+            self._cells[from_key] = bucket
+        else:
+            del self._cells[from_key]
+        # buckets are disjoint, so merging only needs a sort (no np.union1d deduplication pass)
+        self._cells[to_key] = np.sort(np.concatenate((self._cells[to_key], ids))) if to_key in self._cells else np.sort(ids)
+
+    def _set_cells(self, ids, from_key, th, to_age, acode, dy):
+        """
+        Transitions pixels (array of flat pixel indices) to new hash and age, 
+        and flags them as disturbed in the (acode, dy) disturbance layer.
+        """
+        self._move_cells(ids, from_key, (th, to_age))
+        self._snkd[(acode, dy)].append(ids)
+        if common.HAVE_NUMBA:
+            _scatter_cells(self._x0f, self._x1f, ids, th, to_age)
+        else:
+            self._x0f[ids] = th
+            self._x1f[ids] = to_age
+
+    def _disturbed_cells(self, acode, dy):
+        """
+        Returns sorted array of flat indices of pixels disturbed by acode in year dy of current period.
+        The layer is compacted in place into this single array (so later calls do not concatenate again).
+        """
+        ids = self._snkd[(acode, dy)]
+        if not ids: return np.empty(0, dtype=self._idx_dtype)
+        ids[:] = [np.unique(np.concatenate(ids)) if len(ids) > 1 else np.unique(ids[0])]
+        return ids[0]
 
     def _init_snkd(self):
-        self._snkd = {(acode, dy):np.full(self._x[0].shape, 0, dtype=self._tif_dtype) 
+        # disturbed pixels are stored sparsely (list of flat index arrays per (acode, dy) layer),
+        # and only materialized as dense rasters in _write_snk
+        self._snkd = {(acode, dy):[] 
                       for dy in range(0, self._period_length, self._time_step) 
                       for acode in self._acodes}
                 
                 
     def _transition_cells(self, from_dtk, from_age, to_dtk, to_age, tarea, acode, dy,
                           mode='randblk', da=0, fudge=1., ovrflwthr=0, allow_split=True,
-                          verbose=False, nthresh=0, aggregate_disturbance=False):
+                          verbose=False, nthresh=0, aggregate_disturbance=False, fh=None, th=None):
         """
         Modes:
           'randpxl': randomly select individual pixels
           'randblk': randomly select blocks (pixel aggregates)
         randblk mode allocates entire blocks, using the block layer (3) from the raster inventory.
+        Hash values of the from and to development types can be passed in via ``fh`` and ``th``
+        (avoids rehashing when called repeatedly for the same transition).
         """
         assert mode in ('randpxl', 'randblk')
-        fk, tk = tuple(from_dtk), tuple(to_dtk)
-        fh, th = self._hdt_func(fk), self._hdt_func(tk)
-        if 1:
-            #print(fh, from_age)
-            #global ___foo
-            #___foo = self._x
-            #assert False
-            _ix = np.where((self._x[0][self._ix_forested] == fh) & 
-                           (self._x[1][self._ix_forested]+da >= from_age-0) &
-                           (self._x[1][self._ix_forested]+da <= from_age+0))
-            x = self._ix_forested[0][_ix], self._ix_forested[1][_ix]
-        else:
-            x = np.where((self._x[0] == fh) & (self._x[1]+da == from_age))
-        xn = len(x[0])
+        if fh is None: fh = self._hdt_func(tuple(from_dtk))
+        if th is None: th = self._hdt_func(tuple(to_dtk))
+        from_key = (int(fh), int(from_age - da))
+        ids = self._cells.get(from_key) # sorted flat indices of matching pixels
+        if ids is None: ids = np.empty(0, dtype=self._idx_dtype)
+        xn = ids.size
         xa = float(xn * self._pixel_area)
         c = tarea / xa if xa else np.inf
-        print(xn, xa, c, tarea)
+        if verbose > 1: print(xn, xa, c, tarea)
         if c > 1. and verbose > 1: print('missing area:', acode, dy, tarea - xa, from_dtk)
         c = min(c, 1.)
         n = int(round(xa * c / self._pixel_area))
-        print('n', n, 'tarea', tarea)
+        if verbose > 1: print('n', n, 'tarea', tarea)
         if not n: return # found nothing to transition
         if mode == 'randpxl' or n <= nthresh:
-            missing_area = self._transition_cells_randpxl(x, xn, n, th, to_age, acode, dy, tarea, xa)
+            missing_area = self._transition_cells_randpxl(ids, xn, n, th, to_age, acode, dy, tarea, xa, from_key)
         elif mode == 'randblk':
-            missing_area = self._transition_cells_randblk(x, n, th, to_age, acode, dy,
+            missing_area = self._transition_cells_randblk(ids, n, th, to_age, acode, dy, from_key,
                                                           ovrflwthr=ovrflwthr, allow_split=allow_split,
                                                           aggregate_disturbance=aggregate_disturbance)      
         else:
@@ -372,46 +633,89 @@ class ForestRaster:
         return missing_area
 
     
-    def _transition_cells_randpxl(self, x, xn, n, th, to_age, acode, dy, tarea, xa):
-        r = np.random.choice(xn, n, replace=False)
-        ix = x[0][r], x[1][r]
-        self._x[0][ix] = th
-        self._x[1][ix] = to_age
-        self._snkd[(acode, dy)][ix] = 1 
+    def _sample_cells(self, xn, n):
+        """
+        Returns n distinct random indices in range(xn).
+        Uses a partial Fisher-Yates shuffle on a reusable scratch permutation when n is small relative to xn
+        (avoids a full length-xn permutation per call). Without numba, falls back to ``Generator.choice``
+        (which samples small subsets with Floyd's algorithm, in O(n) time).
+        """
+        if 2 * n >= xn:
+            return self._rng.permutation(xn)[:n]
+        if not common.HAVE_NUMBA:
+            return self._rng.choice(xn, n, replace=False)
+        if self._perm_scratch.size < xn:
+            self._perm_scratch = np.arange(max(xn, 2 * self._perm_scratch.size), dtype=np.int64)
+        return _partial_shuffle(self._perm_scratch[:xn], self._rng.random(n))
+
+    def _transition_cells_randpxl(self, x, xn, n, th, to_age, acode, dy, tarea, xa, from_key):
+        self._set_cells(x[self._sample_cells(xn, n)], from_key, th, to_age, acode, dy)
         missing_area = max(0., tarea - xa)
         return missing_area
+
+    def _transition_cells_randpxl_batch(self, from_key, th, to_age, targets, acode):
+        """
+        Randomly selects pixels for a sequence of (dy, target area) pairs with a single draw from the
+        candidate pixel bucket, and splits the sample into annual chunks (earlier years first).
+        Returns list of (dy, missing area) pairs for years that could not be fully allocated.
+        """
+        ids = self._cells.get(from_key)
+        if ids is None or not targets: return []
+        ns = np.array([int(round(t / self._pixel_area)) for _, t in targets])
+        bounds = np.minimum(np.cumsum(ns), ids.size)
+        sample = ids[self._sample_cells(ids.size, int(bounds[-1]))]
+        missing, start = [], 0
+        for (dy, tarea), end in zip(targets, bounds):
+            if end > start:
+                self._set_cells(sample[start:end], from_key, th, to_age, acode, dy)
+            if start == ids.size: break # candidate pixels exhausted
+            if tarea > (ids.size - start) * self._pixel_area: missing.append((dy, tarea - (ids.size - start) * self._pixel_area))
+            start = int(end)
+        return missing
     
         
-    def _transition_cells_randblk(self, x, n, th, to_age, acode, dy, ovrflwthr=0, allow_split=True, aggregate_disturbance=False):
+    def _transition_cells_randblk(self, x, n, th, to_age, acode, dy, from_key, ovrflwthr=0, allow_split=True, aggregate_disturbance=False):
         import scipy
         _n = 0
+        pos = np.flatnonzero(np.bincount(self._blk_pos[x])) # positions of candidate blocks (sorted, no np.unique)
         if not aggregate_disturbance: # classic behaviour
-            blkid = np.unique(self._x[2][x])
-            np.random.shuffle(blkid)
-            blkid = list(blkid)
+            self._rng.shuffle(pos)
         else: # new experimental behaviour
             #print(np.unique(self._x[1]))
             #assert False
-            disturb_heat = scipy.ndimage.gaussian_filter(((self._x[1] >= 0) & (self._x[1] <= self._disturb_thresh)).astype(float), sigma=100)
-            blkid = sorted(list(np.unique(self._x[2][x])), 
-                           key=lambda b: np.ma.MaskedArray(disturb_heat, self._x[2] != b).mean(), 
-                           reverse=True)
+            if self._blk_heat is None: # computed once per period (see grow)
+                disturb_heat = scipy.ndimage.gaussian_filter(
+                    ((self._x[1] >= 0) & (self._x[1] <= self._disturb_thresh)).astype(np.float32), sigma=100,
+                    output=np.float32) # (half the memory traffic of float64)
+                # mean heat of all blocks in one sequential pass over the pixels (no gather into block order)
+                self._blk_heat = np.bincount(self._blk_pos, weights=disturb_heat.ravel(), minlength=self._blkid.size)
+                self._blk_heat /= np.diff(self._blk_bounds)
+            pos = pos[np.argsort(-self._blk_heat[pos], kind='stable')] # descending (stable, like sorted(reverse=True))
             #print(np.ma.MaskedArray(disturb_heat, self._x[2] != blkid[0]).mean())
             #print(np.ma.MaskedArray(disturb_heat, self._x[2] != blkid[-1]).mean())
             #assert False
-        while _n < n and blkid:
-            b = blkid.pop()
-            _ix = np.where(self._x[2][x] == b)
-            ix = x[0][_ix], x[1][_ix]
-            if _n+ix[0].shape[0] > n+ovrflwthr:
-                if blkid: # look for smaller block
-                    continue 
-                elif allow_split:
-                    ix = ix[0][:n-_n], ix[1][:n-_n]
-            _n += ix[0].shape[0]
-            self._x[0][ix] = th
-            self._x[1][ix] = to_age
-            self._snkd[(acode, dy)][ix] = 1
+        is_candidate = self._mask_scratch
+        is_candidate[x] = True
+        try:
+            if common.HAVE_NUMBA:
+                ix = _select_blocks(pos, self._blk_bounds, self._blk_order, is_candidate, x.size, n, n+ovrflwthr, allow_split)
+                _n = ix.size
+                if _n: self._set_cells(ix, from_key, th, to_age, acode, dy)
+            else:
+                blkid = list(self._blkid[pos])
+                while _n < n and blkid:
+                    b = blkid.pop()
+                    bp = self._block_pixels[b]
+                    ix = bp[is_candidate[bp]] # candidate pixels in block (sorted)
+                    if _n+ix.size > n+ovrflwthr:
+                        if blkid: # look for smaller block
+                            continue 
+                        elif allow_split:
+                            ix = ix[:n-_n]
+                    _n += ix.size
+                    self._set_cells(ix, from_key, th, to_age, acode, dy)
+        finally:
+            is_candidate[x] = False
         missing_area = max(0., (n - _n) * self._pixel_area)
         return missing_area
 
@@ -421,6 +725,13 @@ class ForestRaster:
         self._p += 1
         # HACK! #############
         # only increment non-NA values
-        self._x[1][self._x[1] != int(self._src.profile['nodata'])] += 1
+        nodata = self._nodata
+        np.add(self._x1f, 1, out=self._x1f, where=self._x1f != nodata) # in place (no gather/scatter)
         #####################
-        self._init_snkd()
+        cells = {}
+        for (h, a), ids in self._cells.items():
+            key = (h, a if a == nodata else a + 1)
+            cells[key] = np.sort(np.concatenate((cells[key], ids))) if key in cells else ids
+        self._cells = cells
+        for ids in self._snkd.values(): ids.clear() # reuse (acode, dy) layers for new period
+        self._blk_heat = None